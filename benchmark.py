@@ -0,0 +1,245 @@
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from silo import VirtualSilo
+from player import AIPlayer
+from policy import KEYS, BACKENDS, PolicyStore, DenseQTable, SparseQTable, getModelPath, getProfile
+from robocon2024 import Robocon2024Game
+from rng import BlockRandom
+
+# Speed of the simulator and the learner, see the bench sub-command
+# Every result is {'value', 'unit', 'higher_is_better'}, results are compared by name against a baseline
+BENCHMARKS = ('games', 'decisions', 'updates', 'silo', 'policy')
+DEFAULT_SIZES = (10**4, 10**5, 10**6)
+
+def _result(value:float, unit:str, higher_is_better:bool=True) -> dict:
+    return {'value': value, 'unit': unit, 'higher_is_better': higher_is_better}
+
+# Calls per second of fn, called until min_time seconds passed, fn returns the number of calls it made
+def _rate(fn, min_time:float) -> float:
+    count = 0
+    start_time = time.perf_counter()
+    while True:
+        count += fn()
+        elapsed = time.perf_counter() - start_time
+        if (elapsed >= min_time):
+            return count / elapsed
+
+# Run fn in an empty working directory, the AI players read and write ./models
+def _inTempDirectory(fn):
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            return fn()
+        finally:
+            os.chdir(cwd)
+
+def _newPlayers(rng:BlockRandom, backend:str) -> list:
+    return [AIPlayer('Red', 'r', 0.8, backend=backend, rng=rng), AIPlayer('Blue', 'b', 0.8, backend=backend, rng=rng)]
+
+# Games per second of Robocon2024Game.start with two training AI players
+def benchGames(min_time:float, seed:int, backend:str) -> dict:
+    def run():
+        rng = BlockRandom(seed)
+        players = _newPlayers(rng, backend)
+        game = Robocon2024Game(players, rng=rng)
+        def play():
+            winner, score = game.start()
+            for p in players:
+                p.feedReward(winner, score)
+                p.reset()
+            return 1
+        return {'games_per_second': _result(_rate(play, min_time), 'games/s')}
+    return _inTempDirectory(run)
+
+def _playMoves(moves:list, rng:BlockRandom) -> VirtualSilo:
+    silo = VirtualSilo(rng=rng)
+    for i, (marker, col) in enumerate(moves):
+        silo.place(marker, col=col, next_place_time=i)
+        silo.refreshBoard(current_time=i)
+    return silo
+
+# Boards reached by random play, before the end of the game
+def _randomBoards(rng:BlockRandom, count:int) -> list:
+    boards = []
+    while len(boards) < count:
+        moves = []
+        silo = VirtualSilo(rng=rng)
+        while silo.isEndGame() is None:
+            available = silo.getAvailableMove()
+            moves.append(('rb'[len(moves) & 1], available[rng.choice(len(available))]))
+            silo = _playMoves(moves, rng)
+            if (silo.isEndGame() is None):
+                boards.append(silo)
+    return boards[:count]
+
+# AIPlayer.getMove decisions per second on boards of random games, and AIPlayer.learn updates per second
+def benchDecisions(min_time:float, seed:int, backend:str) -> dict:
+    def run():
+        rng = BlockRandom(seed)
+        player = AIPlayer('Red', 'r', 0, speed=0, freeze_time=0, success_rate=0.9, backend=backend, rng=rng)
+        boards = _randomBoards(rng, 1000)
+        def decide():
+            for silo in boards:
+                player.getMove(silo, 0)
+            player.reset()
+            return len(boards)
+        decisions = _rate(decide, min_time)
+
+        # Episodes of 12 decisions, as a player with all of its paddy rice
+        episodes = []
+        for i in range(0, len(boards) - 12, 12):
+            for silo in boards[i:i + 12]:
+                player.getMove(silo, 0)
+            episodes.append(player.getEpisode())
+            player.reset()
+        def update():
+            for profile, states in episodes:
+                player.learn(profile, states, 10)
+            return len(episodes)
+        updates = _rate(update, min_time)
+        return {
+            'decisions_per_second': _result(decisions, 'decisions/s'),
+            'updates_per_second': _result(updates, 'episodes/s'),
+        }
+    return _inTempDirectory(run)
+
+# VirtualSilo.place / refreshBoard and isEndGame calls per second
+def benchSilo(min_time:float, seed:int) -> dict:
+    rng = BlockRandom(seed)
+    columns = [rng.choice(5) for _ in range(1000)]
+    def fill():
+        silo = VirtualSilo(rng=rng)
+        count = 0
+        for i, col in enumerate(columns):
+            if (col not in silo.getAvailableMove()):
+                continue
+            silo.place('rb'[i & 1], col=col, next_place_time=i)
+            silo.refreshBoard(current_time=i)
+            count += 1
+            if (count == 15):
+                break
+        return count
+    boards = _randomBoards(rng, 1000)
+    def endGame():
+        for silo in boards:
+            silo.isEndGame()
+            silo.scoreBoard()
+        return len(boards)
+    return {
+        'refresh_per_second': _result(_rate(fill, min_time), 'placements/s'),
+        'end_game_per_second': _result(_rate(endGame, min_time), 'calls/s'),
+    }
+
+def _syntheticTable(backend:str, size:int, rng:np.random.Generator):
+    keys = rng.choice(KEYS, size=min(size, KEYS), replace=False)
+    values = rng.uniform(-10, 10, size=len(keys)).astype(np.float32)
+    if (backend == 'dense'):
+        table = DenseQTable()
+        table.values[keys] = values
+        return table
+    return SparseQTable(zip(keys.tolist(), values.tolist()))
+
+# Save (as AIPlayer.savePolicy) and load (as AIPlayer.loadPolicy) time and peak memory of synthetic Q-tables
+def benchPolicy(sizes:list, seed:int) -> dict:
+    def run():
+        results = {}
+        rng = np.random.default_rng(seed)
+        profile = getProfile(0, 0.7)
+        player = {backend: AIPlayer('Red', 'r', speed=0, success_rate=0.7, backend=backend) for backend in BACKENDS}
+        for backend in BACKENDS:
+            for size in sizes:
+                table = _syntheticTable(backend, size, rng)
+                store = PolicyStore('./models', backend)
+                store[profile] = table
+                store.markDirty(profile)
+
+                tracemalloc.start()
+                start_time = time.perf_counter()
+                store.save()
+                save_time = time.perf_counter() - start_time
+                save_memory = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                del store, table
+
+                tracemalloc.start()
+                start_time = time.perf_counter()
+                player[backend].loadPolicy()
+                load_time = time.perf_counter() - start_time
+                load_memory = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+                name = '{}_{}'.format(backend, size)
+                results['save_seconds_' + name] = _result(save_time, 's', False)
+                results['save_peak_mb_' + name] = _result(save_memory / 2**20, 'MB', False)
+                results['load_seconds_' + name] = _result(load_time, 's', False)
+                results['load_peak_mb_' + name] = _result(load_memory / 2**20, 'MB', False)
+                os.remove(getModelPath('./models', profile, backend))
+        return results
+    return _inTempDirectory(run)
+
+# Run the benchmarks, return the report with the results by name
+def runBenchmarks(benchmarks:list=BENCHMARKS, min_time:float=2, seed:int=0, backend:str='sparse', sizes:list=DEFAULT_SIZES) -> dict:
+    results = {}
+    for name in benchmarks:
+        if (name == 'games'):
+            results.update(benchGames(min_time, seed, backend))
+        elif (name == 'decisions' or name == 'updates'):
+            if ('decisions_per_second' not in results):
+                results.update(benchDecisions(min_time, seed, backend))
+        elif (name == 'silo'):
+            results.update(benchSilo(min_time, seed))
+        elif (name == 'policy'):
+            results.update(benchPolicy(sizes, seed))
+        else:
+            raise ValueError("benchmark must be one of {}".format(BENCHMARKS))
+    return {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'cpus': os.cpu_count(),
+            'backend': backend,
+            'seed': seed,
+            'min_time': min_time,
+        },
+        'results': results,
+    }
+
+def saveReport(path:str, report:dict) -> None:
+    with open(path, 'w') as fw:
+        json.dump(report, fw, indent=2)
+
+def loadReport(path:str) -> dict:
+    with open(path, 'r') as fr:
+        return json.load(fr)
+
+# Results of the report worse than the baseline by more than the threshold (0.1 = 10%)
+# Return a list of (name, baseline value, value, change), change > 0 is worse
+def compareReports(report:dict, baseline:dict, threshold:float=0.1) -> list:
+    regressions = []
+    for name, result in report['results'].items():
+        if (name not in baseline['results']):
+            continue
+        base = baseline['results'][name]['value']
+        value = result['value']
+        if (base == 0):
+            continue
+        change = (base - value) / base if result['higher_is_better'] else (value - base) / base
+        if (change > threshold):
+            regressions.append((name, base, value, change))
+    return regressions
+
+def printReport(report:dict, baseline:dict=None) -> None:
+    for name, result in report['results'].items():
+        line = "{:<36} {:>14.4g} {}".format(name, result['value'], result['unit'])
+        if (baseline is not None and name in baseline['results']):
+            line += "  (baseline {:.4g})".format(baseline['results'][name]['value'])
+        print(line)
@@ -0,0 +1,144 @@
+import os
+import numpy as np
+from policy import ACTIONS, GREEDY_ORDER, MODEL_FORMATS, getModelPath, greedyActions, loadTable, saveCompactTable
+from player import AIPlayer, RandomPlayer, GreedyPlayer
+from robocon2024 import Robocon2024Game
+from rng import BlockRandom
+from tables import COLUMN_HEIGHT, getColumns
+
+# Compaction of the models: the keys whose value barely moved from 0 are pruned, the others are quantized
+# with one scale per profile and written in the compact file of the profile (see saveCompactTable)
+DTYPES = ('float16', 'int8')
+OPPONENTS = ('random', 'greedy')
+
+# Keys and values of a table sorted by key
+def tableEntries(table) -> tuple:
+    keys = np.fromiter(table.keys(), dtype=np.int64, count=len(table)) if isinstance(table, dict) else table.keys()
+    values = np.array([table[key] for key in keys.tolist()], dtype=np.float64) if isinstance(table, dict) else table.values[keys].astype(np.float64)
+    order = np.argsort(keys)
+    return keys[order], values[order]
+
+# Values quantized to the dtype and their scale, a value reads back as quantized * scale
+# The values keep their sign, a small value never becomes 0 as it would then tie with the keys never learnt
+# int8 scales the largest value, or the clip_percentile percentile of the magnitudes when larger, to 127
+# so that only a few negative values (e.g. after the -999 reward of a player that never scores) saturate
+def quantizeValues(values:np.ndarray, dtype:str='int8', clip_percentile:float=99) -> tuple:
+    if (dtype not in DTYPES):
+        raise ValueError("dtype must be one of {}".format(DTYPES))
+    if (dtype == 'float16'):
+        info = np.finfo(np.float16)
+        quantized = np.clip(values, -info.max, info.max).astype(np.float16)
+        return np.where((quantized == 0) & (values != 0), np.sign(values) * info.smallest_subnormal, quantized).astype(np.float16), 1.0
+    bound = max(float(values.max()), float(np.percentile(np.abs(values), clip_percentile))) if len(values) > 0 else 0
+    scale = bound / 127 if bound > 0 else 1.0
+    magnitudes = np.clip(np.maximum(np.round(np.abs(values) / scale), 1), 1, 127)
+    return (np.sign(values) * magnitudes).astype(np.int8), scale
+
+# Boards of the keys: the board of each key and its action slot, the (boards, ACTIONS) values and the available slots
+# The columns available on a board follow from its code, the missing keys read 0
+def boardValues(keys:np.ndarray, values:np.ndarray) -> tuple:
+    states, slots = np.divmod(keys, ACTIONS)
+    unique, index = np.unique(states, return_inverse=True)
+    board = np.zeros((len(unique), ACTIONS))
+    board[index, slots] = values
+    available = np.ones((len(unique), ACTIONS), dtype=bool)
+    available[:, 1:] = COLUMN_HEIGHT[getColumns(unique >> 1)] < 3
+    return index, slots, board, available
+
+# Raise the quantized value of the greedy action of the boards where rounding changed the greedy action,
+# one step at a time, until every board keeps its action or passes run out
+def keepDecisions(keys:np.ndarray, values:np.ndarray, quantized:np.ndarray, scale:float, passes:int=8) -> np.ndarray:
+    index, slots, board, available = boardValues(keys, values)
+    greedy = greedyActions(board, available) + 1
+    quantized = quantized.copy()
+    for _ in range(passes):
+        board[:] = 0
+        board[index, slots] = quantized.astype(np.float64) * scale
+        changed = greedyActions(board, available) + 1 != greedy
+        raise_keys = changed[index] & (slots == greedy[index])
+        if (not raise_keys.any()):
+            break
+        if (quantized.dtype == np.int8):
+            quantized[raise_keys] = np.minimum(quantized[raise_keys].astype(np.int16) + 1, 127).astype(np.int8)
+        else:
+            quantized[raise_keys] = np.nextafter(quantized[raise_keys], np.float16(np.inf))
+    return quantized
+
+# Keys the greedy action of their board depends on: the greedy key, and the keys that would pass it
+# if they read 0 (the greedy value is negative, or 0 and the key is scanned after it, see GREEDY_ORDER)
+def decisionKeys(keys:np.ndarray, values:np.ndarray) -> np.ndarray:
+    index, slots, board, available = boardValues(keys, values)
+    greedy = greedyActions(board, available) + 1
+    greedy_value = board[np.arange(len(greedy)), greedy][index]
+    position = np.argsort(GREEDY_ORDER)
+    return (slots == greedy[index]) | (greedy_value < 0) | ((greedy_value == 0) & (position[slots] > position[greedy[index]]))
+
+# Keys, quantized values and scale of the compacted table
+# The values within threshold of 0 are pruned unless that changes the greedy action of their board
+# max_entries: the keys the greedy actions depend on are kept first, then the largest values in magnitude
+def compactTable(table, threshold:float=1e-3, dtype:str='int8', max_entries:int=None) -> tuple:
+    keys, values = tableEntries(table)
+    quantized, scale = quantizeValues(values, dtype)
+    quantized = keepDecisions(keys, values, quantized, scale)
+    restored = quantized.astype(np.float64) * scale
+    pruned = np.abs(values) <= threshold
+    index, slots, board, available = boardValues(keys, restored)
+    greedy = greedyActions(board, available)
+    board[index[pruned], slots[pruned]] = 0
+    pruned &= ~(greedyActions(board, available) != greedy)[index]
+    # A value raised to 0 reads the same as a missing key
+    keep = np.flatnonzero(~pruned & (quantized != 0))
+    if (max_entries is not None and len(keep) > max_entries):
+        required = decisionKeys(keys[keep], restored[keep])
+        order = np.lexsort((-np.abs(values[keep]), ~required))
+        keep = np.sort(keep[order[:max_entries]])
+    return keys[keep], quantized[keep], scale
+
+# Size in bytes of the model files of the profile
+def modelSize(directory:str, profile:str) -> int:
+    return sum(os.path.getsize(getModelPath(directory, profile, fmt)) for fmt in MODEL_FORMATS if os.path.exists(getModelPath(directory, profile, fmt)))
+
+# Win rate of a frozen AI player of the profile playing the table, against an opponent drawn again every game
+# The same seed gives the same opponents and the same random numbers to compare two tables
+def winRate(table, profile:str, games:int=1000, opponent:str='random', seed:int=0) -> float:
+    speed, success_rate = profile[1:].split('_R')
+    rng = BlockRandom(seed)
+    player = AIPlayer('AI', 'r', 0, speed=int(speed), freeze_time=0, success_rate=float(success_rate), rng=rng)
+    player.updatePolicy({profile: table})
+    other = RandomPlayer('Random', 'b', rng=rng) if opponent == 'random' else GreedyPlayer('Greedy', 'b', rng=rng)
+    game = Robocon2024Game([player, other], rng=rng)
+    win = 0
+    for _ in range(games):
+        winner, score = game.start()
+        if (player.getReward(winner=winner, score=score) > 1):
+            win += 1
+        player.reset()
+        other.reset()
+    return win / games
+
+# Compact the model of the profile from the directory into the output directory, return the figures of the compaction
+# games: games of the win rate before and after, 0 to skip them
+def compactProfile(directory:str, output:str, profile:str, threshold:float=1e-3, dtype:str='int8', max_entries:int=None, games:int=0, opponent:str='random', seed:int=0) -> dict:
+    table = loadTable(directory, profile, 'sparse')
+    if (table is None):
+        raise FileNotFoundError("No model of profile {} in {}".format(profile, directory))
+    size = modelSize(directory, profile)
+    keys, quantized, scale = compactTable(table, threshold, dtype, max_entries)
+    if (not os.path.exists(output)):
+        os.mkdir(output)
+    saveCompactTable(output, profile, keys, quantized, scale)
+    compacted = loadTable(output, profile, 'sparse')
+    figures = {
+        'profile': profile,
+        'entries_before': len(table),
+        'entries_after': len(compacted),
+        'bytes_before': size,
+        'bytes_after': modelSize(output, profile),
+        'scale': scale,
+        'win_rate_before': None,
+        'win_rate_after': None,
+    }
+    if (games > 0):
+        figures['win_rate_before'] = winRate(table, profile, games, opponent, seed)
+        figures['win_rate_after'] = winRate(compacted, profile, games, opponent, seed)
+    return figures
@@ -0,0 +1,94 @@
+import csv
+import itertools
+import numpy as np
+from player import AIPlayer, RandomPlayer, GreedyPlayer
+from robocon2024 import Robocon2024Game
+from rng import BlockRandom
+
+# Frozen AI players against baseline or AI opponents over a grid of speed / success rate / freeze time cells
+# An AI player never learns nor saves during the evaluation, its tables are only read
+OPPONENTS = ('random', 'greedy', 'ai')
+FIELDS = ('speed', 'success_rate', 'freeze_time', 'opponent', 'games', 'win', 'draw', 'loss', 'win_rate', 'draw_rate', 'loss_rate', 'mean_margin')
+
+# One cell of the grid: the settings of the evaluated player, the opponent and the games to play
+class EvaluationTask:
+    def __init__(self, speed:int, success_rate:float, freeze_time:int, opponent:str, opponent_speed:int, opponent_success_rate:float, opponent_freeze_time:int, games:int, clock:str, backend:str, symmetric:bool, seed) -> None:
+        self.speed = speed
+        self.success_rate = success_rate
+        self.freeze_time = freeze_time
+        self.opponent = opponent
+        # None: drawn again for every game
+        self.opponent_speed = opponent_speed
+        self.opponent_success_rate = opponent_success_rate
+        self.opponent_freeze_time = opponent_freeze_time
+        self.games = games
+        self.clock = clock
+        self.backend = backend
+        self.symmetric = symmetric
+        self.seed = seed # SeedSequence of the random numbers of the cell
+
+def _newOpponent(task:EvaluationTask, rng:BlockRandom):
+    settings = dict(speed=task.opponent_speed, freeze_time=task.opponent_freeze_time, success_rate=task.opponent_success_rate, rng=rng)
+    if (task.opponent == 'random'):
+        return RandomPlayer('Random', 'b', **settings)
+    if (task.opponent == 'greedy'):
+        return GreedyPlayer('Greedy', 'b', **settings)
+    return AIPlayer('Opponent', 'b', 0, backend=task.backend, symmetric=task.symmetric, **settings)
+
+# Play the games of a cell, return its row of results
+def evaluateCell(task:EvaluationTask) -> dict:
+    rng = BlockRandom(task.seed)
+    player = AIPlayer('AI', 'r', 0, speed=task.speed, freeze_time=task.freeze_time, success_rate=task.success_rate, backend=task.backend, symmetric=task.symmetric, rng=rng)
+    opponent = _newOpponent(task, rng)
+    game = Robocon2024Game([player, opponent], clock=task.clock, rng=rng)
+    win, draw, loss, margin = 0, 0, 0, 0
+    for _ in range(task.games):
+        winner, score = game.start()
+        reward = player.getReward(winner=winner, score=score)
+        if (reward == 1):
+            draw += 1
+        elif (reward > 1):
+            win += 1
+        else:
+            loss += 1
+        margin += score.get(player.marker, 0) - score.get(opponent.marker, 0)
+        player.reset()
+        opponent.reset()
+    return {
+        'speed': task.speed, 'success_rate': task.success_rate, 'freeze_time': task.freeze_time, 'opponent': task.opponent,
+        'games': task.games, 'win': win, 'draw': draw, 'loss': loss,
+        'win_rate': win / task.games, 'draw_rate': draw / task.games, 'loss_rate': loss / task.games,
+        'mean_margin': margin / task.games,
+    }
+
+# Tasks of every cell of the grid, each with its own random stream spawned from the seed
+def gridTasks(speeds:list, success_rates:list, freeze_times:list, opponent:str='random', opponent_speed:int=None, opponent_success_rate:float=None, opponent_freeze_time:int=None, games:int=1000, clock:str='event', backend:str='sparse', symmetric:bool=False, seed:int=None) -> list:
+    if (opponent not in OPPONENTS):
+        raise ValueError("opponent must be one of {}".format(OPPONENTS))
+    cells = list(itertools.product(speeds, success_rates, freeze_times))
+    seeds = np.random.SeedSequence(seed).spawn(len(cells))
+    return [EvaluationTask(speed, success_rate, freeze_time, opponent, opponent_speed, opponent_success_rate, opponent_freeze_time, games, clock, backend, symmetric, seeds[i]) for i, (speed, success_rate, freeze_time) in enumerate(cells)]
+
+# Evaluate the cells on a pool of processes, every row is written to the CSV file as soon as its cell completes
+# Return the rows in completion order
+def evaluate(tasks:list, path:str, workers:int=1, progress=None) -> list:
+    rows = []
+    with open(path, 'w', newline='') as fw:
+        writer = csv.DictWriter(fw, fieldnames=FIELDS)
+        writer.writeheader()
+        fw.flush()
+        def write(row:dict) -> None:
+            writer.writerow(row)
+            fw.flush()
+            rows.append(row)
+            if (progress is not None):
+                progress.update(1)
+        if (workers <= 1):
+            for task in tasks:
+                write(evaluateCell(task))
+        else:
+            import multiprocessing
+            with multiprocessing.Pool(workers) as pool:
+                for row in pool.imap_unordered(evaluateCell, tasks):
+                    write(row)
+    return rows
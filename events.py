@@ -0,0 +1,116 @@
+import json
+import sys
+
+# Observer of the game events, every method does nothing by default
+# Games, silos and players hold None instead of a sink when nobody listens, so that no event is built
+class EventSink:
+    # A new game starts on the silo
+    def onGameStart(self, silo) -> None:
+        pass
+
+    # Paddy rice landed in the silo at the time
+    def onPlace(self, silo, t:float) -> None:
+        pass
+
+    # The player chose the action among the available actions
+    def onDecision(self, player, t:float, available_actions:list, action:int) -> None:
+        pass
+
+    # The game ended with the winner ('f' for full silo, None for no one) and the score
+    def onEndGame(self, silo, winner:str, score:dict) -> None:
+        pass
+
+    # The player was rewarded at the end of the game
+    def onReward(self, player, reward:int) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+# Forward the events to several sinks
+class MultiSink(EventSink):
+    def __init__(self, sinks:list) -> None:
+        self.sinks = list(sinks)
+
+    def onGameStart(self, silo) -> None:
+        for sink in self.sinks:
+            sink.onGameStart(silo)
+
+    def onPlace(self, silo, t:float) -> None:
+        for sink in self.sinks:
+            sink.onPlace(silo, t)
+
+    def onDecision(self, player, t:float, available_actions:list, action:int) -> None:
+        for sink in self.sinks:
+            sink.onDecision(player, t, available_actions, action)
+
+    def onEndGame(self, silo, winner:str, score:dict) -> None:
+        for sink in self.sinks:
+            sink.onEndGame(silo, winner, score)
+
+    def onReward(self, player, reward:int) -> None:
+        for sink in self.sinks:
+            sink.onReward(player, reward)
+
+    def close(self) -> None:
+        for sink in self.sinks:
+            sink.close()
+
+# Print the game on the console
+class ConsoleSink(EventSink):
+    def __init__(self, decisions:bool=True) -> None:
+        self.decisions = decisions # print the decisions of the players
+
+    def onGameStart(self, silo) -> None:
+        print("================")
+        silo.printSilo()
+        print("================")
+
+    def onPlace(self, silo, t:float) -> None:
+        print("Current Time: {:.1f}".format(t))
+        print("=====PLACE======")
+        silo.printSilo()
+        print("================")
+
+    def onDecision(self, player, t:float, available_actions:list, action:int) -> None:
+        if (self.decisions == True):
+            print("Player {} (Marker {}) choose {} from {} at Time {:.1f}".format(player.name, player.marker, action, available_actions, t))
+
+    def onEndGame(self, silo, winner:str, score:dict) -> None:
+        print("================")
+        silo.printSilo()
+        print("================")
+        print(f"{'Winner '+ winner if winner != 'f' and winner != None else 'No one end Game'}")
+        print(score)
+
+    def onReward(self, player, reward:int) -> None:
+        print(f"{player.name} : {reward}")
+
+# Write one JSON object per event, for analysis after the run
+class JsonLinesSink(EventSink):
+    def __init__(self, path:str) -> None:
+        self.__file = sys.stdout if path == '-' else open(path, 'a')
+        self.game = 0
+
+    def __write(self, event:dict) -> None:
+        self.__file.write(json.dumps(event) + '\n')
+
+    def onGameStart(self, silo) -> None:
+        self.game += 1
+        self.__write({'event': 'start', 'game': self.game})
+
+    def onPlace(self, silo, t:float) -> None:
+        self.__write({'event': 'place', 'game': self.game, 'time': round(t, 1), 'board': silo.getBoard()})
+
+    def onDecision(self, player, t:float, available_actions:list, action:int) -> None:
+        self.__write({'event': 'decision', 'game': self.game, 'time': round(t, 1), 'player': player.name, 'marker': player.marker, 'available_actions': available_actions, 'action': action})
+
+    def onEndGame(self, silo, winner:str, score:dict) -> None:
+        self.__write({'event': 'end', 'game': self.game, 'winner': winner, 'score': score, 'board': silo.getBoard()})
+
+    def onReward(self, player, reward:int) -> None:
+        self.__write({'event': 'reward', 'game': self.game, 'player': player.name, 'marker': player.marker, 'reward': reward})
+
+    def close(self) -> None:
+        if (self.__file is not sys.stdout):
+            self.__file.close()
@@ -0,0 +1,68 @@
+import hashlib
+import os
+import struct
+import numpy as np
+from silo import Silo
+from policy import ACTIONS, MIRROR_SLOTS, getProfile, greedyActions, loadTable, mirrorCode, toBackend
+from tables import COLUMN_HEIGHT, getColumns
+
+# Read-only policy of one profile for the robot: the greedy action of every (board code, paddy rice alert),
+# so a decision is one index and no pickle is ever read on the field machine
+# The file starts with HEADER: MAGIC, speed (uint8), success rate in tenths (uint8), padding,
+# entries (uint32) and the SHA-256 of the actions, then the actions (int8) indexed by (code << 1) + alert
+MAGIC = b'SILOPOL1'
+HEADER = struct.Struct('<8sBBxxI32s')
+ENTRIES = Silo.STATES * 2
+
+def getPolicyPath(directory:str, profile:str) -> str:
+    return os.path.join(directory, 'AI_{}.policy'.format(profile))
+
+# Greedy action of every (board code, alert) of a table, with the tie break of AIPlayer.getMove
+# symmetric: the table was learnt with --symmetric, the mirrored boards read their canonical board
+def compileTable(table, symmetric:bool=False) -> np.ndarray:
+    values = toBackend(table, 'dense').values.reshape(Silo.STATES, 2, ACTIONS)
+    codes = np.arange(Silo.STATES)
+    if (symmetric == True):
+        mirrored = mirrorCode(codes)
+        flip = mirrored < codes
+        values = np.where(flip[:, None, None], values[np.minimum(codes, mirrored)][..., MIRROR_SLOTS], values)
+    available = np.ones((Silo.STATES, ACTIONS), dtype=bool)
+    available[:, 1:] = COLUMN_HEIGHT[getColumns(codes)] < 3
+    return greedyActions(values, available[:, None, :]).astype(np.int8).reshape(ENTRIES)
+
+# Compile the table of the profile from the model directory and write it to the output directory, return its path
+def exportPolicy(directory:str, profile:str, output:str, backend:str='dense', symmetric:bool=False) -> str:
+    table = loadTable(directory, profile, backend)
+    if (table is None):
+        raise FileNotFoundError("No model of profile {} in {}".format(profile, directory))
+    actions = compileTable(table, symmetric).tobytes()
+    speed, success_rate = profile[1:].split('_R')
+    header = HEADER.pack(MAGIC, int(speed), round(float(success_rate) * 10), ENTRIES, hashlib.sha256(actions).digest())
+    if (not os.path.exists(output)):
+        os.mkdir(output)
+    path = getPolicyPath(output, profile)
+    temp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(temp_path, 'wb') as fw:
+            fw.write(header + actions)
+        os.replace(temp_path, path)
+    finally:
+        if (os.path.exists(temp_path)):
+            os.remove(temp_path)
+    return path
+
+# Actions of an exported policy, read at once and checked against its header
+def loadPolicy(path:str, profile:str=None) -> np.ndarray:
+    with open(path, 'rb') as fr:
+        data = fr.read()
+    if (len(data) < HEADER.size):
+        raise ValueError("{} is not an exported policy".format(path))
+    magic, speed, rate, entries, digest = HEADER.unpack_from(data)
+    if (magic != MAGIC or entries != ENTRIES):
+        raise ValueError("{} is not an exported policy".format(path))
+    if (profile is not None and getProfile(speed, rate / 10) != profile):
+        raise ValueError("{} holds profile {}, not {}".format(path, getProfile(speed, rate / 10), profile))
+    actions = memoryview(data)[HEADER.size:]
+    if (len(actions) != ENTRIES or hashlib.sha256(actions).digest() != digest):
+        raise ValueError("{} is truncated or corrupted".format(path))
+    return np.frombuffer(actions, dtype=np.int8)
@@ -1,19 +1,20 @@
 from silo import VirtualSilo
-import shutil
-import sys
+from policy import ACTIONS, MIRROR_SLOTS, PolicyStore, canonicalCode, encodeKey, getProfile, greedyActions, listProfiles, loadTable, mirrorAction
 import os
-import re
 import numpy as np
-import pickle
-import random
+from rng import BlockRandom
+from frozen import getPolicyPath, loadPolicy
+from tables import COLUMN_OWN_MARK, COLUMN_OPPONENT_MARK, COLUMN_HEIGHT, COLUMN_BITS, getColumns, getTables
 
 class Player:
     PADDY_RICE_NUM = 12
-    def __init__(self, name:str, marker:str, speed:float=None, freeze_time:int=None, success_rate:float=None) -> None:
+    def __init__(self, name:str, marker:str, speed:float=None, freeze_time:int=None, success_rate:float=None, rng:BlockRandom=None, verbose:bool=False) -> None:
         # Name: just player name for display
         # Marker: the mark placed inside the silo (Either 'b', 'r')
         # Speed: The interval of placing a paddy rice into silo (0-30)
         # Freeze Time: The start time of the player (0-170), more than 170 = lose
+        # Rng: random numbers of the player (see rng.py), the game replaces it with its own stream
+        # Verbose: print the settings of the player
 
         if (not isinstance(name,str)):
             raise TypeError("name must have string type")
@@ -25,6 +26,11 @@ class Player:
             raise ValueError("marker must be either 'b' or 'r' ")
         self.name = name
         self._marker = marker.lower()
+        # Settings given to the player, the ones left None are drawn again on every reset
+        self._original_speed = speed
+        self._original_freeze_time = freeze_time
+        self._original_success_rate = success_rate
+        self.rng = rng if rng is not None else BlockRandom()
 
         # Determining the speed
         if (speed is not None):
@@ -32,7 +38,7 @@ class Player:
             speed = min(speed, 18)
             self._speed = speed
         else:
-            self._speed = Player.generateSpeed()
+            self._speed = Player.generateSpeed(self.rng)
 
         # Determining the drop rate
         if (success_rate is not None):
@@ -40,12 +46,12 @@ class Player:
             success_rate = min(success_rate, 1.0)
             self._success_rate = success_rate
         else:
-            self._success_rate = Player.generateSuccessRate()
+            self._success_rate = Player.generateSuccessRate(self.rng)
 
         # Determining the freeze time
         if (freeze_time == None):
             #A random time getting to zone 3
-            self._freeze_time = random.randint(0, 170)
+            self._freeze_time = Player.generateFreezeTime(self.rng)
         else:
             freeze_time = max(freeze_time, 0)
             freeze_time = min(freeze_time, 170)
@@ -60,7 +66,14 @@ class Player:
         #The last motion that the robot place the paddy rice
         self._last_place_col = None
 
-        print("Initialized player {} (Mark: {}) with speed {}, Time to zone 3: {}, Success rate: {}".format(self.name, self._marker, self._speed, self._freeze_time, self._success_rate))
+        #Observer of the decisions, see events.py
+        self.sink = None
+
+        #Q-table lookups and learnt states, see profiling.py
+        self.profiler = None
+
+        if (verbose == True):
+            print("Initialized player {} (Mark: {}) with speed {}, Time to zone 3: {}, Success rate: {}".format(self.name, self._marker, self._speed, self._freeze_time, self._success_rate))
 
     @property
     def marker(self) -> str:
@@ -70,18 +83,67 @@ class Player:
     def paddy_rice_alert(self) -> bool:
         return self._paddy_rice <= Player.PADDY_RICE_NUM * self._success_rate
 
+    # Reset the player for a new game
+    def reset(self) -> None:
+        self._paddy_rice = Player.PADDY_RICE_NUM
+        self._next_place_time = 0
+        self._last_place_col = None
+
+        if (self._original_speed == None):
+            self._speed = Player.generateSpeed(self.rng)
+
+        if (self._original_freeze_time == None):
+            self._freeze_time = Player.generateFreezeTime(self.rng)
+        
+        if (self._original_success_rate == None):
+            self._success_rate = Player.generateSuccessRate(self.rng)
+
+    #Reward of the game result for the player
+    def getReward(self, winner:str, score:dict) -> int:
+        original_reward = None
+        # Case not even place one paddy rice to the silo
+        if (self._marker not in score):
+            original_reward = -999
+        # The player is the winner
+        elif (winner == self._marker):
+            original_reward = 10
+        # There is no one to end game
+        elif (winner == 'f' or winner == None):
+            # Check if overwhelmed success
+            overwhelmed = True
+            for key in score:
+                if (key == self._marker):
+                    continue
+                overwhelmed = False
+
+                #Determine the score by comparison
+                if (score[self._marker] > score[key]):
+                    original_reward = 2
+                elif (score[self._marker] < score[key]):
+                    original_reward = -2
+                else:
+                    original_reward = 1
+            #only self got score
+            if (overwhelmed == True):
+                original_reward = 2
+        # Losed in the game, others win by end game
+        else:
+            original_reward = -10
+
+        return original_reward
+
     #Generate a speed
-    def generateSpeed(slowest:float=18, fastest:float=0) -> float:
-        return random.randint(fastest,slowest)
+    def generateSpeed(rng:BlockRandom, slowest:float=18, fastest:float=0) -> float:
+        return rng.randint(fastest,slowest)
 
     #Generate freeze time, meaning the time start zone 3
-    def generateFreezeTime() -> int:
-        return random.randint(0, 170)
+    def generateFreezeTime(rng:BlockRandom) -> int:
+        return rng.randint(0, 170)
 
     #Generate a success rate, meaning the rate that it successfully place the paddy rice into the silo
-    def generateSuccessRate() -> float:
+    def generateSuccessRate(rng:BlockRandom) -> float:
         available_rate = [0.7, 0.8, 0.9, 1.0]
-        idx = np.random.choice(len(available_rate))
+        idx = rng.choice(len(available_rate))
         return available_rate[idx]
 
     # #Generate a speed profile
@@ -107,7 +169,7 @@ class Player:
         self._next_place_time = t + time_need
 
         # Random determine if it could successfully place the paddy rice
-        if (np.random.uniform(0, 1) <= self._success_rate):
+        if (self.rng.random() <= self._success_rate):
             # Silo will handle the event, and refresh silo based on the decision
             silo.place(self._marker, col=col, next_place_time=self._next_place_time)
 
@@ -125,14 +187,20 @@ class Player:
             return [-1]
         return silo.getAvailableMove() + [-1]
 
+    # The earliest time the player could make an action, None if it has no more paddy rice
+    def getNextActionTime(self) -> float:
+        if (self._paddy_rice == 0):
+            return None
+        return max(self._freeze_time, self._next_place_time)
+
     def getMove(self, silo:VirtualSilo, t:float) -> int:
         raise RuntimeError("It is just an abstract class. Please choose either human or computer player")
 
     
 
 class HumanPlayer(Player):
-    def __init__(self, name:str, marker:str, speed:int, freeze_time:int=None, success_rate:float=None) -> None:
-        super(HumanPlayer, self).__init__(name, marker, speed=speed, freeze_time=freeze_time, success_rate=success_rate)
+    def __init__(self, name:str, marker:str, speed:int, freeze_time:int=None, success_rate:float=None, rng:BlockRandom=None, verbose:bool=False) -> None:
+        super(HumanPlayer, self).__init__(name, marker, speed=speed, freeze_time=freeze_time, success_rate=success_rate, rng=rng, verbose=verbose)
 
     #Manual deciding factor
     def getMove(self, silo:VirtualSilo, t:float) -> int:
@@ -151,61 +219,81 @@ class HumanPlayer(Player):
                 data = int(data)
                 if (data not in available_actions):
                     raise ValueError('Invalid input! ')                
+                if (self.sink is not None):
+                    self.sink.onDecision(self, t, available_actions, data)
                 return data
             except Exception:
                 print("Invalid Input! Avaiable Action: {}".format(available_actions))
 
+#Baseline dropping its paddy rice in a random available column
+class RandomPlayer(Player):
+    def getMove(self, silo:VirtualSilo, t:float) -> int:
+        if (t < self._freeze_time):
+            return -1
+        available_actions = self._getNextAvailableMove(silo=silo, t=t)
+        if (len(available_actions) <= 1):
+            return -1
+        # The last available action is -1
+        final_action = available_actions[self.rng.choice(len(available_actions) - 1)]
+        if (self.sink is not None):
+            self.sink.onDecision(self, t, available_actions, final_action)
+        return final_action
+
+_greedy_values = None
+
+# Value of every board code for GreedyPlayer, seen from the own colour:
+# a win first, then no win left to the opponent in one drop, then the Marks and the top cells
+def _greedyValues() -> np.ndarray:
+    global _greedy_values
+    if (_greedy_values is None):
+        tables = getTables()
+        columns = getColumns(np.arange(len(tables.winner)))
+        threat = ((tables.winner[np.maximum(tables.next_state[:, 1, :], 0)] == 2) & (tables.next_state[:, 1, :] >= 0)).any(axis=1)
+        own_tops = ((COLUMN_HEIGHT == 3) & ((COLUMN_BITS & 4) != 0))[columns].sum(axis=1)
+        _greedy_values = (100 * (tables.winner == 1) - 50 * threat + 4 * (COLUMN_OWN_MARK[columns].sum(axis=1) - COLUMN_OPPONENT_MARK[columns].sum(axis=1)) + own_tops).astype(np.float64)
+    return _greedy_values
+
+#Baseline dropping its paddy rice in the column with the best board after the drop, it never stays
+class GreedyPlayer(Player):
+    def getMove(self, silo:VirtualSilo, t:float) -> int:
+        if (t < self._freeze_time):
+            return -1
+        available_actions = self._getNextAvailableMove(silo=silo, t=t)
+        if (len(available_actions) <= 1):
+            return -1
+        after = getTables().next_state[silo.getSiloCode(self._marker), 0]
+        values = np.full(ACTIONS, -np.inf)
+        values[1:] = np.where(after >= 0, _greedyValues()[np.maximum(after, 0)], -np.inf)
+        available = np.zeros(ACTIONS, dtype=bool)
+        available[np.array(available_actions[:-1]) + 1] = True
+        final_action = int(greedyActions(values, available))
+        if (self.sink is not None):
+            self.sink.onDecision(self, t, available_actions, final_action)
+        return final_action
+
 class AIPlayer(Player):
-    def __init__(self, name:str, marker:str, random_rate:int=0, speed:int=None, freeze_time:int=None, success_rate:float=None, verbose:bool=False) -> None:
-        if (not os.path.exists('models')):
-            os.mkdir('models')
-        super(AIPlayer, self).__init__(name, marker, speed=speed, freeze_time=freeze_time, success_rate=success_rate)
-        self.__original_speed = speed
-        self.__original_freeze_time = freeze_time
-        self.__original_success_rate = success_rate
-        self.__verbose = verbose # determine if show debug message
+    def __init__(self, name:str, marker:str, random_rate:int=0, speed:int=None, freeze_time:int=None, success_rate:float=None, verbose:bool=False, backend:str='sparse', cache_size:int=None, symmetric:bool=False, rng:BlockRandom=None, max_entries:int=None) -> None:
+        # The models directory is created when a table is first saved
+        super(AIPlayer, self).__init__(name, marker, speed=speed, freeze_time=freeze_time, success_rate=success_rate, rng=rng, verbose=verbose)
         self.__states = []  # record all positions taken
         self.__learning_rate = 0.2
         self.__random_rate = random_rate #Only applicable when training
         self.__decay_gamma = 0.9
+        self.__backend = backend # 'dense' array or 'sparse' dict Q-tables, see policy.py
+        self.__symmetric = symmetric # look up and learn mirrored boards in their canonical orientation
 
-        if (os.path.exists('./models')):
-            self.__game_dictionary = self.loadPolicy(verbos=verbose)
-        
-        if (self.__profile not in self.__game_dictionary):
-            self.__game_dictionary[self.__profile] = {}
+        # Tables are read when their profile is first used, at most cache_size of them stay open
+        # and each sparse table keeps at most max_entries states, the least recently updated ones are dropped
+        self.__game_dictionary = PolicyStore('./models', backend, cache_size=cache_size, verbose=verbose, max_entries=max_entries)
+        self.__game_dictionary[self.__profile]
 
     @property
     def __profile(self):
-        return 'S{}_R{:.1f}'.format(int(self._speed), self._success_rate)
+        return getProfile(self._speed, self._success_rate)
 
-    def __generateProfile(self, speed:int, success_rate:float) -> None:
-        return 'S{}_R{:.1f}'.format(int(speed), success_rate)
-
-    # Helper function to find out correct files
-    def __isValidFilename(string):
-        pattern = r'^AI_S\d+_R\d+\.\d+\.ai$'
-        if re.match(pattern, string):
-            return True
-        return False
-    
-    # Helper function to get the speed trained for that file
-    def __extractSpeedFromFilename(string):
-        pattern = r'^AI_S(\d+)_R(\d+\.\d+)\.ai$'
-        match = re.match(pattern, string)
-        if match:
-            int_value = int(match.group(1))
-            float_value = float(match.group(2))
-            return int_value, float_value
-        return None
-    
-    # Hash state of the robot agent
-    def __getGameDictionaryHashState(self, silo:VirtualSilo, t:float, action:str) -> str:
-        # speed_profile = ["{:.1f}".format(speed) for speed in self._speed_profile]
-        current_table_states = silo.getSiloHash(self._marker)
-        # time = "{:.1f}".format(180-t)
-        return f"{current_table_states}-{self.paddy_rice_alert}-{action}"
-        # return f"{speed_profile}-{current_table_states}-{time}-{valid_actions}-{action}"
+    # Key of the robot agent state, packing (board code, paddy rice alert, action)
+    def __getGameDictionaryKey(self, code:int, action:int) -> int:
+        return encodeKey(code, self.paddy_rice_alert, action)
 
     # The movement decision
     def getMove(self, silo:VirtualSilo, t:float) -> None:
@@ -214,36 +302,41 @@ class AIPlayer(Player):
         
         # Get all availabe actions
         available_actions = self._getNextAvailableMove(silo=silo, t=t)
-        if (len(available_actions) > 1):
-            if (self.__verbose == True):
-                print("Player {} (Marker {}) Available Actions {} at Time {:.1f}".format(self.name, self.marker, available_actions, t))
-
         #Only one action availabe, that's mean not able to do the things
-        else:
+        if (len(available_actions) <= 1):
             # Means there is nothing to do
             return -1
         
+        code = silo.getSiloCode(self._marker)
+        mirrored = False
+        if (self.__symmetric == True):
+            code, mirrored = canonicalCode(code)
+        # Key of action -1, the key of action a is key + a + 1 (key + mirrorAction(a) + 1 on a mirrored board)
+        key = self.__getGameDictionaryKey(code, -1)
+
         # Random Behaviour when for training
-        if np.random.uniform(0, 1) <= self.__random_rate:
-            idx = np.random.choice(len(available_actions))
+        if self.rng.random() <= self.__random_rate:
+            idx = self.rng.choice(len(available_actions))
             final_action = available_actions[idx]
         else:
-            # Choose the max value choice
-            max_value = -sys.maxsize - 1
-            for action in available_actions:
-                hash_state = self.__getGameDictionaryHashState(silo=silo, t=t, action=action)
-                # hash_state = self.__getGameDictionaryHashState(silo=silo, t=t, valid_actions=available_actions, action=action)
-                value = 0 if hash_state not in self.__game_dictionary[self.__profile] else self.__game_dictionary[self.__profile][hash_state]
-                # print(f"Action: {action}, Value: {value}")
-                if (value >= max_value):
-                    max_value = value
-                    final_action = action
+            # Choose the max value choice, the values of all actions are read at once
+            available = np.zeros(ACTIONS, dtype=bool)
+            available[np.array(available_actions) + 1] = True
+            values = self.__game_dictionary[self.__profile].actionValues(code, self.paddy_rice_alert)
+            if (mirrored == True):
+                # Values back in the orientation of the silo, so ties break the same way
+                values = values[MIRROR_SLOTS]
+            final_action = int(greedyActions(values, available))
+            if (self.profiler is not None):
+                hits = int(np.count_nonzero(values[available]))
+                self.profiler.count('table_hit', hits)
+                self.profiler.count('table_miss', len(available_actions) - hits)
         
-        # Record the decision made
-        self.__addState(self.__getGameDictionaryHashState(silo=silo, t=t, action=final_action))
+        # Record the decision made, feedReward then learns the canonical keys
+        self.__addState(key + (mirrorAction(final_action) if mirrored == True else final_action) + 1)
 
-        if (self.__verbose == True):
-            print("Player {} (Marker {}) choose {} at Time {:.1f}".format(self.name, self.marker, final_action, t))
+        if (self.sink is not None):
+            self.sink.onDecision(self, t, available_actions, final_action)
 
         return final_action
 
@@ -252,101 +345,103 @@ class AIPlayer(Player):
 
     #Feed reward to the player
     def feedReward(self, winner:str, score:dict) -> int:
-        original_reward = None
-        # Case not even place one paddy rice to the silo
-        if (self._marker not in score):
-            original_reward = -999
-        # The player is the winner
-        elif (winner == self._marker):
-            original_reward = 10
-        # There is no one to end game
-        elif (winner == 'f' or winner == None):
-            # Check if overwhelmed success
-            overwhelmed = True
-            for key in score:
-                if (key == self._marker):
-                    continue
-                overwhelmed = False
-
-                #Determine the score by comparison
-                if (score[self._marker] > score[key]):
-                    original_reward = 2
-                elif (score[self._marker] < score[key]):
-                    original_reward = -2
-                else:
-                    original_reward = 1
-            #only self got score
-            if (overwhelmed == True):
-                original_reward = 2
-        # Losed in the game, others win by end game
-        else:
-            original_reward = -10
-
-        # Bring forward
-        reward = original_reward
-        for state in reversed(self.__states):
-            if state not in self.__game_dictionary[self.__profile]:
-                self.__game_dictionary[self.__profile][state] = 0
-            self.__game_dictionary[self.__profile][state] += self.__learning_rate * (self.__decay_gamma * reward - self.__game_dictionary[self.__profile][state])
-            reward = self.__game_dictionary[self.__profile][state]
-
+        original_reward = self.getReward(winner=winner, score=score)
+        self.learn(self.__profile, self.__states, original_reward)
         return original_reward
 
+    #Bring forward the reward through the states recorded in one episode of the profile
+    #Return the sum of the absolute changes of the Q-values and the number of states learnt for the first time
+    def learn(self, profile:str, states:list, reward:float) -> tuple:
+        if (self.profiler is not None):
+            phase_time = self.profiler.start()
+        change, new_states = self.__game_dictionary[profile].learn(states, reward, self.__learning_rate, self.__decay_gamma)
+        self.__game_dictionary.markDirty(profile)
+        if (self.profiler is not None):
+            self.profiler.stop('learn', phase_time)
+            self.profiler.count('episodes')
+            self.profiler.count('states', len(states))
+        return change, new_states
+
+    #The profile and the states recorded in the current episode
+    def getEpisode(self) -> tuple:
+        return self.__profile, list(self.__states)
+
+    #Entries of the tables of the profiles open in memory
+    def getEntries(self) -> dict:
+        return self.__game_dictionary.entries()
+
+    #Copy of the tables of the profiles
+    def getPolicy(self, profiles) -> dict:
+        return {profile: self.__game_dictionary[profile].copy() for profile in profiles}
+
+    #Changes of the tables of the given profiles, keys: the keys learnt in each profile, in the order they were learnt
+    #Only the learnt keys are sent, unless the tables can be closed: a table read back would miss the values received before
+    def getPolicyChanges(self, keys:dict) -> dict:
+        if (self.__game_dictionary.cache_size is not None):
+            return self.getPolicy(keys)
+        return {profile: self.__game_dictionary[profile].changes(keys[profile]) for profile in keys}
+
+    #Replace the tables of the given profiles, e.g. with the ones learnt by another process
+    #A table can also be given as the changes returned by getPolicyChanges
+    def updatePolicy(self, policy:dict) -> None:
+        for profile in policy:
+            if (isinstance(policy[profile], tuple)):
+                self.__game_dictionary[profile].assign(*policy[profile])
+            else:
+                self.__game_dictionary[profile] = policy[profile]
+
     # Reset the player
     def reset(self) -> None:
-        self._paddy_rice = Player.PADDY_RICE_NUM
-        self._next_place_time = 0
-        self._last_place_col = None
+        super(AIPlayer, self).reset()
 
         self.__states = []
-
-        if (self.__original_speed == None):
-            self._speed = Player.generateSpeed()
-
-        if (self.__original_freeze_time == None):
-            self._freeze_time = Player.generateFreezeTime()
-        
-        if (self.__original_success_rate == None):
-            self._success_rate = Player.generateSuccessRate()
         
-        if (self.__profile not in self.__game_dictionary):
-            self.__game_dictionary[self.__profile] = {}
+        # Open the table of the new profile before the game starts
+        self.__game_dictionary[self.__profile]
 
-    # Save the model
-    def savePolicy(self) -> None:
-        game_dictionary = {}
-        game_dictionary = self.loadPolicy()
-        for profile in game_dictionary:
-            if (profile not in self.__game_dictionary):
-                self.__game_dictionary[profile] = {}
-             
-            for key in game_dictionary[profile]:
-                #Average two learning Q values
-                if (key not in self.__game_dictionary[profile]):
-                    self.__game_dictionary[profile][key] = game_dictionary[profile][key]
-                    
-        
-        for profile in self.__game_dictionary:
-            fw = open('./models/AI_{}.ai'.format(profile), 'wb')
-            pickle.dump(self.__game_dictionary[profile], fw)
-            fw.close()
+    # Save the model, only the profiles learnt since the last save are written
+    def savePolicy(self) -> list:
+        return self.__game_dictionary.save()
 
-    # Load the model
+    # Load the model of every profile
     def loadPolicy(self, verbos=False) -> dict:
         game_dictionary = {}
-        for filename in os.listdir('./models'):
-            
-            if (AIPlayer.__isValidFilename(filename) == False):
-                continue
-            
-            speed, success_rate = AIPlayer.__extractSpeedFromFilename(filename)
-            
+        for profile in sorted(listProfiles('./models')):
             if (verbos == True):
-                print("Reading {}... (Extracted as speed {}, success rate {})".format(filename, speed, success_rate))
-            fr = open('./models/{}'.format(filename), 'rb')
-            profile = self.__generateProfile(speed=speed, success_rate=success_rate)
-            game_dictionary[profile] = pickle.load(fr)
+                print("Reading profile {}...".format(profile))
+            game_dictionary[profile] = loadTable('./models', profile, self.__backend)
+
+        return game_dictionary
+
+#AI player of the field machine: it plays the policies compiled by export, never learns nor explores
+#The policy of a profile is read once from the directory, a decision is one index in it
+class FrozenAIPlayer(Player):
+    def __init__(self, name:str, marker:str, directory:str='./policies', speed:int=None, freeze_time:int=None, success_rate:float=None, rng:BlockRandom=None, verbose:bool=False) -> None:
+        super(FrozenAIPlayer, self).__init__(name, marker, speed=speed, freeze_time=freeze_time, success_rate=success_rate, rng=rng, verbose=verbose)
+        self.directory = directory
+        self.__policies = {}
+        self.__actions = self.__getPolicy()
+
+    def __getPolicy(self) -> np.ndarray:
+        profile = getProfile(self._speed, self._success_rate)
+        if (profile not in self.__policies):
+            path = getPolicyPath(self.directory, profile)
+            if (not os.path.exists(path)):
+                raise FileNotFoundError("No exported policy of profile {} in {}".format(profile, self.directory))
+            self.__policies[profile] = loadPolicy(path, profile)
+        return self.__policies[profile]
 
-            fr.close()
+    def getMove(self, silo:VirtualSilo, t:float) -> int:
+        if (t < self._freeze_time):
+            return -1
+        available_actions = self._getNextAvailableMove(silo=silo, t=t)
+        if (len(available_actions) <= 1):
+            return -1
+        final_action = int(self.__actions[(silo.getSiloCode(self._marker) << 1) + self.paddy_rice_alert])
+        if (self.sink is not None):
+            self.sink.onDecision(self, t, available_actions, final_action)
+        return final_action
 
-        return game_dictionary
\ No newline at end of file
+    def reset(self) -> None:
+        super(FrozenAIPlayer, self).reset()
+        self.__actions = self.__getPolicy()
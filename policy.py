@@ -0,0 +1,527 @@
+import ast
+import itertools
+import os
+import pickle
+import re
+from collections import OrderedDict
+import numpy as np
+from silo import Silo
+
+# Filename of the model saved for one speed / success rate profile
+# .ai files hold a pickled dict (sparse backend), .npy files a float32 array of all keys (dense backend),
+# .npz files the keys and quantized values written by compact, read by either backend
+MODEL_FILENAME = re.compile(r'^AI_S(\d+)_R(\d+\.\d+)\.(ai|npy|npz)$')
+BACKENDS = ('dense', 'sparse')
+MODEL_FORMATS = BACKENDS + ('compact', )
+MODEL_EXTENSIONS = {'dense': 'npy', 'sparse': 'ai', 'compact': 'npz'}
+
+# Name of the speed / success rate profile, as used in the model filenames
+def getProfile(speed:int, success_rate:float) -> str:
+    return 'S{}_R{:.1f}'.format(int(speed), success_rate)
+
+# Actions of a player: -1 (stay) and columns 0-4
+ACTIONS = 6
+# Number of distinct state-action keys
+KEYS = Silo.STATES * 2 * ACTIONS
+
+# Pack (board code, paddy rice alert, action) into a single Q-table key
+def encodeKey(code:int, alert:bool, action:int) -> int:
+    return ((code << 1) + alert) * ACTIONS + action + 1
+
+# Unpack a Q-table key into (board code, paddy rice alert, action)
+def decodeKey(key:int) -> tuple:
+    state, action = divmod(key, ACTIONS)
+    return state >> 1, bool(state & 1), action - 1
+
+# Keys of every action of the boards, slot k holds action k - 1: (ACTIONS,) for one board, (n, ACTIONS) for arrays
+def actionKeys(codes, alerts) -> np.ndarray:
+    return ((np.asarray(codes, dtype=np.int64) << 1) + np.asarray(alerts, dtype=np.int64))[..., None] * ACTIONS + np.arange(ACTIONS)
+
+# Greedy choice scans the columns then -1 and keeps the last maximum (the >= of the scan in AIPlayer.getMove)
+GREEDY_ORDER = np.array([1, 2, 3, 4, 5, 0])
+
+# Greedy actions from the values of every action slot (..., ACTIONS), among the available slots
+def greedyActions(values:np.ndarray, available:np.ndarray) -> np.ndarray:
+    ordered = np.where(available, values, -np.inf)[..., GREEDY_ORDER]
+    return GREEDY_ORDER[ACTIONS - 1 - ordered[..., ::-1].argmax(axis=-1)] - 1
+
+# The silo is left-right symmetric: column i plays as column 4 - i
+# Board code with the columns in reverse order, for an int or an array of codes
+def mirrorCode(code):
+    mirrored = 0
+    for weight in reversed(Silo.COLUMN_WEIGHTS):
+        code, column = divmod(code, Silo.COLUMN_STATES)
+        mirrored = mirrored + column * weight
+    return mirrored
+
+def mirrorAction(action:int) -> int:
+    return action if action < 0 else 4 - action
+
+# Action slot of the mirrored board holding each action slot
+MIRROR_SLOTS = np.array([0, 5, 4, 3, 2, 1])
+
+# Canonical orientation of a board code: the smaller of the code and its mirror, and whether it is mirrored
+def canonicalCode(code:int) -> tuple:
+    mirrored = mirrorCode(code)
+    return (mirrored, True) if mirrored < code else (code, False)
+
+# Table with every key in the canonical orientation, a key and its mirror learnt both hold their mean
+def foldTable(table):
+    keys = np.fromiter(table.keys(), dtype=np.int64, count=len(table))
+    values = np.array([table[key] for key in keys.tolist()], dtype=np.float64) if isinstance(table, dict) else table.values[keys].astype(np.float64)
+    states, slots = np.divmod(keys, ACTIONS)
+    codes, alerts = states >> 1, states & 1
+    mirrored = mirrorCode(codes)
+    flip = mirrored < codes
+    keys = np.where(flip, ((mirrored << 1) + alerts) * ACTIONS + MIRROR_SLOTS[slots], keys)
+    keys, order = np.unique(keys, return_inverse=True)
+    values = np.bincount(order, weights=values, minlength=len(keys)) / np.bincount(order, minlength=len(keys))
+    if (isinstance(table, DenseQTable)):
+        folded = DenseQTable()
+        folded.values[keys] = values
+        return folded
+    return SparseQTable(zip(keys.tolist(), values.tolist()))
+
+# Tables saved before the integer encoding use keys like "[[1, 0, 0], ...]-True-3"
+# A table never mixes both kinds of keys, so the first key tells
+def isLegacyTable(table:dict) -> bool:
+    return isinstance(next(iter(table), None), str)
+
+def decodeLegacyKey(key:str) -> int:
+    idx = key.index(']]') + 2
+    board = ast.literal_eval(key[:idx])
+    alert, action = key[idx+1:].split('-', 1)
+    return encodeKey(Silo.encodeBoard(board, own=1, empty=0), alert == 'True', int(action))
+
+# Convert a table with string keys into integer keys
+def migrateLegacyTable(table:dict) -> dict:
+    migrated = {}
+    for key, value in table.items():
+        migrated[decodeLegacyKey(key) if isinstance(key, str) else key] = value
+    return migrated
+
+# Rewrite every legacy model file in the directory with integer keys, return the migrated filenames
+def migrateModels(directory:str='./models') -> list:
+    migrated = []
+    for filename in sorted(os.listdir(directory)):
+        match = MODEL_FILENAME.match(filename)
+        if (match is None or match.group(3) != 'ai'):
+            continue
+        path = os.path.join(directory, filename)
+        with open(path, 'rb') as fr:
+            table = pickle.load(fr)
+        if (not isLegacyTable(table)):
+            continue
+        with open(path, 'wb') as fw:
+            pickle.dump(migrateLegacyTable(table), fw)
+        migrated.append(filename)
+    return migrated
+
+# Q-table of one profile stored in a dict, only the visited keys are kept
+class SparseQTable(dict):
+    # Values of an array of keys
+    def lookup(self, keys:np.ndarray) -> np.ndarray:
+        return np.array([self.get(key, 0) for key in keys.ravel().tolist()], dtype=np.float64).reshape(np.shape(keys))
+
+    # Values of every action slot of one board
+    def actionValues(self, code:int, alert:bool) -> np.ndarray:
+        key = encodeKey(code, alert, -1)
+        return np.array([self.get(key + i, 0) for i in range(ACTIONS)], dtype=np.float64)
+
+    # Bring forward the reward through the states of one episode
+    # Return the sum of the absolute changes of the values and the number of keys learnt for the first time
+    def learn(self, states:list, reward:float, learning_rate:float, decay_gamma:float) -> tuple:
+        change = 0
+        new_states = 0
+        for state in reversed(states):
+            if state not in self:
+                self[state] = 0
+                new_states += 1
+            update = learning_rate * (decay_gamma * reward - self[state])
+            self[state] += update
+            change += abs(update)
+            reward = self[state]
+        return change, new_states
+
+    # Take the values of the keys not learnt in this table from the other table
+    def merge(self, other) -> None:
+        for key, value in other.items():
+            if (key not in self):
+                self[key] = value
+
+    # The given keys still in the table and their values, to bring a copy of the table up to date
+    def changes(self, keys) -> tuple:
+        keys = [key for key in keys if key in self]
+        return keys, [self[key] for key in keys]
+
+    # Set the values of the keys given by changes
+    def assign(self, keys, values) -> None:
+        self.update(zip(keys, values))
+
+    def copy(self):
+        return SparseQTable(self)
+
+# Sparse Q-table holding at most max_entries keys, the keys are kept in the order they were last updated
+# and the least recently updated ones are dropped when an episode brings the table over the limit
+class BoundedQTable(SparseQTable):
+    def __init__(self, entries=(), max_entries:int=None) -> None:
+        super(BoundedQTable, self).__init__(entries)
+        if (max_entries is None or max_entries < 1):
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = max_entries
+        self.evict()
+
+    # Same backup as SparseQTable.learn, every updated key moves to the end of the table
+    def learn(self, states:list, reward:float, learning_rate:float, decay_gamma:float) -> tuple:
+        change = 0
+        new_states = 0
+        for state in reversed(states):
+            value = self.pop(state, None)
+            if (value is None):
+                value = 0
+                new_states += 1
+            update = learning_rate * (decay_gamma * reward - value)
+            value += update
+            self[state] = value
+            change += abs(update)
+            reward = value
+        self.evict()
+        return change, new_states
+
+    # The keys taken from the other table count as the least recently updated, so that they are dropped
+    # before the keys learnt in this table
+    def merge(self, other) -> None:
+        learnt = dict(self)
+        self.clear()
+        self.update((key, value) for key, value in other.items() if key not in learnt)
+        self.update(learnt)
+
+    # The keys are given in the order they were learnt, they move to the end of the table as in learn
+    # and the keys dropped from the other table are the ones dropped here
+    def assign(self, keys, values) -> None:
+        for key, value in zip(keys, values):
+            self.pop(key, None)
+            self[key] = value
+        self.evict()
+
+    # Drop the least recently updated keys over the limit, return the number of keys dropped
+    def evict(self) -> int:
+        excess = len(self) - self.max_entries
+        if (excess <= 0):
+            return 0
+        for key in list(itertools.islice(self, excess)):
+            del self[key]
+        return excess
+
+# Q-table of one profile stored in a contiguous float32 array indexed by the key
+# Keys never learnt hold 0, the same value a missing key has in SparseQTable
+class DenseQTable:
+    def __init__(self, values:np.ndarray=None) -> None:
+        self.values = np.zeros(KEYS, dtype=np.float32) if values is None else values
+
+    def get(self, key:int, default:float=0) -> float:
+        return float(self.values[key])
+
+    def __getitem__(self, key:int) -> float:
+        return float(self.values[key])
+
+    def __setitem__(self, key:int, value:float) -> None:
+        self.values[key] = value
+
+    def __contains__(self, key:int) -> bool:
+        return self.values[key] != 0
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.values))
+
+    def keys(self) -> np.ndarray:
+        return np.flatnonzero(self.values)
+
+    def items(self):
+        keys = self.keys()
+        return zip(keys.tolist(), self.values[keys].tolist())
+
+    def lookup(self, keys:np.ndarray) -> np.ndarray:
+        return self.values[keys]
+
+    # The action slots of a board are contiguous
+    def actionValues(self, code:int, alert:bool) -> np.ndarray:
+        key = encodeKey(code, alert, -1)
+        return self.values[key:key + ACTIONS]
+
+    # Same backup as SparseQTable.learn, computed on the unique keys of the episode
+    # The keys holding 0 count as learnt for the first time
+    def learn(self, states:list, reward:float, learning_rate:float, decay_gamma:float) -> tuple:
+        if (len(states) == 0):
+            return 0, 0
+        keys, order = np.unique(np.asarray(states, dtype=np.int64), return_inverse=True)
+        values = self.values[keys].tolist()
+        new_states = values.count(0)
+        change = 0
+        for i in reversed(order.tolist()):
+            update = learning_rate * (decay_gamma * reward - values[i])
+            values[i] += update
+            change += abs(update)
+            reward = values[i]
+        self.values[keys] = values
+        return change, new_states
+
+    def merge(self, other) -> None:
+        if (isinstance(other, DenseQTable)):
+            self.values = np.where(self.values == 0, other.values, self.values)
+            return
+        for key, value in other.items():
+            if (self.values[key] == 0):
+                self.values[key] = value
+
+    def changes(self, keys) -> tuple:
+        keys = np.fromiter(keys, dtype=np.int64)
+        return keys, self.values[keys]
+
+    def assign(self, keys, values) -> None:
+        self.values[keys] = values
+
+    def copy(self):
+        return DenseQTable(np.array(self.values))
+
+def newTable(backend:str):
+    if (backend not in BACKENDS):
+        raise ValueError("backend must be one of {}".format(BACKENDS))
+    return DenseQTable() if backend == 'dense' else SparseQTable()
+
+# Convert a table to the backend
+def toBackend(table, backend:str):
+    if (backend == 'dense' and not isinstance(table, DenseQTable)):
+        dense = DenseQTable()
+        dense.merge(table)
+        return dense
+    if (backend == 'sparse' and not isinstance(table, SparseQTable)):
+        return SparseQTable(table.items())
+    return table
+
+# Path of the model file of the profile in a format of MODEL_FORMATS
+def getModelPath(directory:str, profile:str, backend:str) -> str:
+    return os.path.join(directory, 'AI_{}.{}'.format(profile, MODEL_EXTENSIONS[backend]))
+
+# Dense files with more entries than this stay dense when read by the sparse backend: a dict entry takes
+# about 100 bytes, the dense array 4 bytes per key (e.g. the tables written by solve)
+DENSE_KEEP_ENTRIES = KEYS // 25
+
+# Read the table of the profile, in the file of the backend, the file of the other backend or the compact file
+def loadTable(directory:str, profile:str, backend:str):
+    for file_backend in (backend, ) + tuple(b for b in MODEL_FORMATS if b != backend):
+        path = getModelPath(directory, profile, file_backend)
+        if (not os.path.exists(path)):
+            continue
+        if (file_backend == 'compact'):
+            with np.load(path) as data:
+                keys = data['keys'].astype(np.int64)
+                values = data['values'].astype(np.float64) * float(data['scale'])
+            if (backend == 'dense'):
+                table = DenseQTable()
+                table.values[keys] = values
+                return table
+            return SparseQTable(zip(keys.tolist(), values.tolist()))
+        if (file_backend == 'dense'):
+            # Copy-on-write mapping: only the pages read are loaded, the writes stay in memory
+            table = DenseQTable(np.load(path, mmap_mode='c'))
+            if (backend == 'sparse' and len(table) > DENSE_KEEP_ENTRIES):
+                return table
+        else:
+            with open(path, 'rb') as fr:
+                table = pickle.load(fr)
+            # Tables saved with string keys are converted, they are saved back with integer keys
+            if (isLegacyTable(table)):
+                table = migrateLegacyTable(table)
+            table = SparseQTable(table)
+        return toBackend(table, backend)
+    return None
+
+# Write the table of the profile in the file of its backend, and drop the file of the other backend
+# The file is written aside and renamed, so a crash never leaves a truncated file
+# and a table mapped from the previous file keeps reading it
+def saveTable(directory:str, profile:str, table) -> None:
+    backend = 'dense' if isinstance(table, DenseQTable) else 'sparse'
+    path = getModelPath(directory, profile, backend)
+    temp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(temp_path, 'wb') as fw:
+            if (backend == 'dense'):
+                np.save(fw, table.values)
+            else:
+                pickle.dump(dict(table), fw)
+            fw.flush()
+            os.fsync(fw.fileno())
+        os.replace(temp_path, path)
+    finally:
+        if (os.path.exists(temp_path)):
+            os.remove(temp_path)
+    for other in MODEL_FORMATS:
+        if (other != backend and os.path.exists(getModelPath(directory, profile, other))):
+            os.remove(getModelPath(directory, profile, other))
+
+# Write the keys and the quantized values of the profile in its compact file, a value is values[i] * scale
+# The files of the backends are dropped, the table is read back from the compact file by either backend
+def saveCompactTable(directory:str, profile:str, keys:np.ndarray, values:np.ndarray, scale:float) -> None:
+    path = getModelPath(directory, profile, 'compact')
+    temp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(temp_path, 'wb') as fw:
+            np.savez(fw, keys=np.asarray(keys, dtype=np.int32), values=values, scale=np.float64(scale))
+            fw.flush()
+            os.fsync(fw.fileno())
+        os.replace(temp_path, path)
+    finally:
+        if (os.path.exists(temp_path)):
+            os.remove(temp_path)
+    for backend in BACKENDS:
+        if (os.path.exists(getModelPath(directory, profile, backend))):
+            os.remove(getModelPath(directory, profile, backend))
+
+# Fold every model of the directory into the canonical orientation, return the folded profiles
+def foldModels(directory:str='./models') -> list:
+    folded = []
+    for filename in sorted(os.listdir(directory)):
+        match = MODEL_FILENAME.match(filename)
+        if (match is None):
+            continue
+        profile = getProfile(int(match.group(1)), float(match.group(2)))
+        backend = 'dense' if match.group(3) == 'npy' else 'sparse'
+        saveTable(directory, profile, foldTable(loadTable(directory, profile, backend)))
+        folded.append(profile)
+    return folded
+
+# Profiles saved in the directory
+def listProfiles(directory:str) -> set:
+    if (not os.path.isdir(directory)):
+        return set()
+    profiles = set()
+    for filename in os.listdir(directory):
+        match = MODEL_FILENAME.match(filename)
+        if (match is not None):
+            profiles.add(getProfile(int(match.group(1)), float(match.group(2))))
+    return profiles
+
+# Tables of all profiles of a model directory, opened when first used
+# At most cache_size tables are kept open (None for no limit), the least recently used one is closed first
+# and written back if it was learnt
+# max_entries: sparse tables hold at most max_entries keys each, see BoundedQTable (None for no limit)
+class PolicyStore:
+    def __init__(self, directory:str, backend:str, cache_size:int=None, verbose:bool=False, max_entries:int=None) -> None:
+        if (backend not in BACKENDS):
+            raise ValueError("backend must be one of {}".format(BACKENDS))
+        if (cache_size is not None and cache_size < 1):
+            raise ValueError("cache_size must be at least 1")
+        if (max_entries is not None and backend != 'sparse'):
+            raise ValueError("max_entries needs the sparse backend, dense tables have a fixed size")
+        self.directory = directory
+        self.backend = backend
+        self.cache_size = cache_size
+        self.max_entries = max_entries
+        self.__verbose = verbose
+        self.__tables = OrderedDict()
+        self.__dirty = set()
+        # Version of the files of each profile when last read or written, see __getVersion
+        self.__versions = {}
+        # Profiles saved in the directory
+        self.__saved = listProfiles(directory)
+
+    # All profiles, saved or open
+    def profiles(self) -> set:
+        return self.__saved | set(self.__tables)
+
+    # Profiles open in memory, from the least to the most recently used
+    def opened(self) -> list:
+        return list(self.__tables)
+
+    def __contains__(self, profile:str) -> bool:
+        return profile in self.__tables or profile in self.__saved
+
+    # The table of the profile, read from the directory or created when first used
+    def __getitem__(self, profile:str):
+        if (profile in self.__tables):
+            self.__tables.move_to_end(profile)
+            return self.__tables[profile]
+
+        table = None
+        if (profile in self.__saved):
+            if (self.__verbose == True):
+                print("Reading profile {}...".format(profile))
+            self.__versions[profile] = self.__getVersion(profile)
+            table = loadTable(self.directory, profile, self.backend)
+        if (table is None):
+            table = newTable(self.backend)
+        table = self.__bound(table)
+        self.__tables[profile] = table
+        self.__evict()
+        return table
+
+    # The table limited to max_entries keys when a limit is set
+    def __bound(self, table):
+        if (self.max_entries is None or isinstance(table, BoundedQTable)):
+            return table
+        return BoundedQTable(toBackend(table, 'sparse'), self.max_entries)
+
+    # Replace the table of the profile, it is not written back unless learnt afterwards
+    def __setitem__(self, profile:str, table) -> None:
+        self.__tables[profile] = self.__bound(toBackend(table, self.backend))
+        self.__tables.move_to_end(profile)
+        self.__dirty.discard(profile)
+        self.__evict()
+
+    # Mark the table of the profile as learnt, it will be written back
+    def markDirty(self, profile:str) -> None:
+        self.__dirty.add(profile)
+
+    def __evict(self) -> None:
+        while (self.cache_size is not None and len(self.__tables) > self.cache_size):
+            profile, table = self.__tables.popitem(last=False)
+            if (profile in self.__dirty):
+                self.__save(profile, table)
+            if (self.__verbose == True):
+                print("Closed profile {}".format(profile))
+
+    # Modification time and size of the files of the profile
+    def __getVersion(self, profile:str) -> tuple:
+        version = []
+        for backend in MODEL_FORMATS:
+            try:
+                stat = os.stat(getModelPath(self.directory, profile, backend))
+                version.append((backend, stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                pass
+        return tuple(version)
+
+    def __save(self, profile:str, table) -> None:
+        if (not os.path.exists(self.directory)):
+            os.mkdir(self.directory)
+        # The file only needs to be merged when someone else wrote it since it was read or written here
+        version = self.__getVersion(profile)
+        if (len(version) > 0 and version != self.__versions.get(profile)):
+            saved = loadTable(self.directory, profile, self.backend)
+            if (saved is not None):
+                # Keep the values learnt, take the others from the file
+                table.merge(saved)
+                if (isinstance(table, BoundedQTable)):
+                    table.evict()
+        saveTable(self.directory, profile, table)
+        self.__versions[profile] = self.__getVersion(profile)
+        self.__saved.add(profile)
+        self.__dirty.discard(profile)
+
+    # Entries of every table open in memory
+    def entries(self) -> dict:
+        return {profile: len(table) for profile, table in self.__tables.items()}
+
+    # Profiles learnt since they were last written
+    def dirty(self) -> set:
+        return set(self.__dirty)
+
+    # Write back every learnt table that is open, return the profiles written
+    def save(self) -> list:
+        saved = []
+        for profile in list(self.__tables):
+            if (profile in self.__dirty):
+                self.__save(profile, self.__tables[profile])
+                saved.append(profile)
+        return saved
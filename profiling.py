@@ -0,0 +1,57 @@
+import time
+
+# Cumulative wall time and calls of the phases of the game loop, and event counters
+# Games, silos and players hold None instead of a profiler when it is disabled, so that nothing is measured
+class Profiler:
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.seconds = {}
+        self.calls = {}
+        self.counters = {}
+
+    # Start time of a phase, to give back to stop
+    def start(self) -> float:
+        return time.perf_counter()
+
+    def stop(self, phase:str, start_time:float) -> None:
+        self.seconds[phase] = self.seconds.get(phase, 0) + time.perf_counter() - start_time
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+
+    def count(self, name:str, n:int=1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    # Add the figures of a snapshot, e.g. taken in a worker process
+    def merge(self, snapshot:dict) -> None:
+        for phase, figures in snapshot['phases'].items():
+            self.seconds[phase] = self.seconds.get(phase, 0) + figures['seconds']
+            self.calls[phase] = self.calls.get(phase, 0) + figures['calls']
+        for name, value in snapshot['counters'].items():
+            self.count(name, value)
+
+    # Copy of the figures, with the Q-table hit rate and the states visited per episode
+    def snapshot(self) -> dict:
+        lookups = self.counters.get('table_hit', 0) + self.counters.get('table_miss', 0)
+        episodes = self.counters.get('episodes', 0)
+        return {
+            'phases': {phase: {'seconds': self.seconds[phase], 'calls': self.calls[phase]} for phase in self.seconds},
+            'counters': dict(self.counters),
+            'table_hit_rate': self.counters.get('table_hit', 0) / lookups if lookups > 0 else None,
+            'states_per_episode': self.counters.get('states', 0) / episodes if episodes > 0 else None,
+        }
+
+    # Text table of a snapshot, the phases sorted by time
+    def report(self) -> str:
+        snapshot = self.snapshot()
+        total = sum(figures['seconds'] for figures in snapshot['phases'].values())
+        lines = ["{:<16} {:>10} {:>12} {:>10} {:>7}".format('phase', 'calls', 'seconds', 'us/call', 'share')]
+        for phase, figures in sorted(snapshot['phases'].items(), key=lambda item: -item[1]['seconds']):
+            lines.append("{:<16} {:>10} {:>12.3f} {:>10.2f} {:>6.1%}".format(phase, figures['calls'], figures['seconds'], 1e6 * figures['seconds'] / figures['calls'], figures['seconds'] / total if total > 0 else 0))
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append("{:<16} {:>10}".format(name, value))
+        if (snapshot['table_hit_rate'] is not None):
+            lines.append("Q-table hit rate: {:.1%}".format(snapshot['table_hit_rate']))
+        if (snapshot['states_per_episode'] is not None):
+            lines.append("States per episode: {:.2f}".format(snapshot['states_per_episode']))
+        return '\n'.join(lines)
@@ -0,0 +1,102 @@
+import os
+import struct
+import numpy as np
+from policy import PolicyStore, getProfile, listProfiles
+from vecsilo import getRewards, NO_WINNER, FULL
+
+# Append-only binary log of the episodes learnt by the AI players, to learn them again without the simulator
+# The file starts with MAGIC, then one record per player and episode, in the order they were learnt:
+#   speed (uint8), success rate in tenths (uint8), reward (int16), own score (int16), opponent score (int16),
+#   result (int8: 0 no one, 1 own win, 2 opponent win, 3 full silo), padding, states (uint16), then the keys (int32)
+MAGIC = b'SILOLOG1'
+RECORD = struct.Struct('<BBhhhbxH')
+
+# Result of the game seen from the marker, same values as VecVirtualSilo.isEndGame for team 1
+def encodeResult(winner:str, marker:str) -> int:
+    if (winner == None):
+        return NO_WINNER
+    if (winner == 'f'):
+        return FULL
+    return 1 if winner == marker else 2
+
+# Length of the log up to the end of its last complete record, only the record headers are read
+def completeLength(path:str) -> int:
+    size = os.path.getsize(path)
+    with open(path, 'rb') as fr:
+        if (fr.read(len(MAGIC)) != MAGIC):
+            raise ValueError("{} is not an episode log".format(path))
+        offset = len(MAGIC)
+        while offset + RECORD.size <= size:
+            fr.seek(offset)
+            count = RECORD.unpack(fr.read(RECORD.size))[-1]
+            if (offset + RECORD.size + 4 * count > size):
+                break
+            offset += RECORD.size + 4 * count
+    return offset
+
+class EpisodeLog:
+    # A record cut by a crash at the end of the log is dropped before appending, the next records stay readable
+    def __init__(self, path:str) -> None:
+        self.path = path
+        length = completeLength(path) if os.path.exists(path) and os.path.getsize(path) >= len(MAGIC) else 0
+        self.__file = open(path, 'ab')
+        if (self.__file.tell() != length):
+            self.__file.truncate(length)
+            self.__file.seek(length)
+        if (length == 0):
+            self.__file.write(MAGIC)
+
+    # Record the states of one player of an episode with its outcome
+    def append(self, profile:str, states:list, winner:str, score:dict, marker:str, reward:int) -> None:
+        speed, success_rate = profile[1:].split('_R')
+        own = score.get(marker, 0)
+        other = sum(value for key, value in score.items() if key != marker)
+        header = RECORD.pack(int(speed), round(float(success_rate) * 10), reward, own, other, encodeResult(winner, marker), len(states))
+        self.__file.write(header + np.asarray(states, dtype='<i4').tobytes())
+
+    def flush(self) -> None:
+        self.__file.flush()
+
+    def close(self) -> None:
+        self.__file.close()
+
+# Records of a log, memory-mapped: a list of (profile, reward, own score, opponent score, result, keys)
+# A record cut by a crash at the end of the file is left out
+def readLog(path:str) -> list:
+    data = np.memmap(path, dtype=np.uint8, mode='r')
+    if (bytes(data[:len(MAGIC)]) != MAGIC):
+        raise ValueError("{} is not an episode log".format(path))
+    records = []
+    offset = len(MAGIC)
+    while offset + RECORD.size <= len(data):
+        speed, rate, reward, own, other, result, count = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        if (offset + 4 * count > len(data)):
+            break
+        keys = np.frombuffer(data, dtype='<i4', count=count, offset=offset)
+        offset += 4 * count
+        records.append((getProfile(speed, rate / 10), reward, own, other, result, keys))
+    return records
+
+# Learn the records again from empty tables into the directory, return the number of episodes learnt
+# The directory must hold no models: the models trained from the same episodes already learnt them once
+# reward: None for the rewards of AIPlayer.getReward from the outcome, or fn(result, own, other) -> rewards on arrays
+def replayLog(path:str, directory:str='./models_replay', backend:str='sparse', learning_rate:float=0.2, decay_gamma:float=0.9, reward=None, cache_size:int=None) -> int:
+    if (len(listProfiles(directory)) > 0):
+        raise ValueError("{} already holds models, replay would learn into them".format(directory))
+    records = readLog(path)
+    if (len(records) == 0):
+        return 0
+    result = np.array([record[4] for record in records])
+    own = np.array([record[2] for record in records])
+    other = np.array([record[3] for record in records])
+    rewards = getRewards(result, own, other, 1) if reward is None else reward(result, own, other)
+
+    if (not os.path.exists(directory)):
+        os.mkdir(directory)
+    store = PolicyStore(directory, backend, cache_size=cache_size)
+    for (profile, _, _, _, _, keys), value in zip(records, rewards.tolist()):
+        store[profile].learn(keys.tolist(), value, learning_rate, decay_gamma)
+        store.markDirty(profile)
+    store.save()
+    return len(records)
@@ -0,0 +1,37 @@
+import numpy as np
+
+# Random numbers of a game, drawn from a numpy Generator in blocks instead of one call per number
+# The streams are reproducible from the seed, spawn() gives independent streams (e.g. one per worker)
+class BlockRandom:
+    def __init__(self, seed=None, block_size:int=4096) -> None:
+        # seed: int, numpy SeedSequence or None for fresh entropy
+        self.seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.generator = np.random.default_rng(self.seed_sequence)
+        self.block_size = block_size
+        self.__block = []
+        self.__index = 0
+
+    # Uniform float in [0, 1)
+    def random(self) -> float:
+        if (self.__index == len(self.__block)):
+            self.__block = self.generator.random(self.block_size).tolist()
+            self.__index = 0
+        value = self.__block[self.__index]
+        self.__index += 1
+        return value
+
+    # Uniform int in [0, n)
+    def choice(self, n:int) -> int:
+        return int(self.random() * n)
+
+    # Uniform int in [low, high], both included as random.randint
+    def randint(self, low:int, high:int) -> int:
+        return low + self.choice(high - low + 1)
+
+    # n independent streams
+    def spawn(self, n:int) -> list:
+        return [BlockRandom(seed, self.block_size) for seed in self.seed_sequence.spawn(n)]
+
+# n independent Generators, e.g. for batch environments of vecsilo.py
+def spawnGenerators(seed, n:int) -> list:
+    return [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(n)]
@@ -1,85 +1,147 @@
 from argparse import ArgumentParser
-from silo import VirtualSilo
-from player import HumanPlayer
-from player import AIPlayer
 import sys
 import os
-from tqdm import tqdm
 import traceback
 import time
+# The modules of the game (silo.py, player.py, rng.py and NumPy under them), of the training (tqdm, multiprocessing,
+# replay.py, telemetry.py) and of each sub-command are imported where they are used, so that --help and the
+# argument errors load none of them and a game does not load the training
 
 GAMETIME = 180
+TICK = 0.1
+# Game clock: 'tick' steps every 0.1s, 'event' skips the ticks where nothing can happen
+CLOCKS = ('tick', 'event')
 class Robocon2024Game:
-    def __init__(self, player:list):
+    # sink: observer of the game events (see events.py), None when nobody listens
+    # check: compare the end game and score aggregates of the silo with a scan of the board
+    # rng: random numbers of the game and its players (see rng.py), a new unseeded stream when None
+    # profiler: time and calls of the phases of the game (see profiling.py), None when disabled
+    def __init__(self, player:list, clock:str='event', sink=None, check:bool=False, rng:'BlockRandom'=None, profiler:'Profiler'=None):
         if (len(player) != 2):
             raise ValueError("There can only be two player in the game")
         if (player[0].marker == player[1].marker):
             raise RuntimeError("Two player contains the same mark")
+        if (clock not in CLOCKS):
+            raise ValueError("clock must be one of {}".format(CLOCKS))
         self.player = player
+        self.clock = clock
+        self.sink = sink
+        self.check = check
+        from rng import BlockRandom
+        self.rng = rng if rng is not None else BlockRandom()
+        self.profiler = profiler
+        for p in player:
+            p.sink = sink
+            p.rng = self.rng
+            p.profiler = profiler
+
+    # Advance the clock tick by tick to the next time a player could act or a paddy rice lands
+    # The skipped ticks are the ones where getMove returns -1 and refreshBoard does nothing
+    def __skipIdleTime(self, current_time:float, end_time:float) -> float:
+        next_time = end_time
+        for event_time in (self.player[0].getNextActionTime(), self.player[1].getNextActionTime(), self.silo.getNextPlaceTime()):
+            if (event_time is not None and event_time < next_time):
+                next_time = event_time
+        # Same accumulation as the tick clock, so that both clocks see the same times
+        while current_time < next_time:
+            current_time += TICK
+        return current_time
     
     def start(self):
-        self.silo = VirtualSilo()
+        from silo import VirtualSilo
+        self.silo = VirtualSilo(sink=self.sink, check=self.check, rng=self.rng, profiler=self.profiler)
+        profiler = self.profiler
         start_time = 0
         current_time = 0
 
-        print("================")
-        self.silo.printSilo()
-        print("================")
+        if (self.sink is not None):
+            self.sink.onGameStart(self.silo)
 
         #Either it is 3 mins game or it has Winner
         while self.silo.isEndGame() == None and current_time - start_time < GAMETIME:
             self.silo.refreshBoard(current_time=current_time)
             for i in range(2):
+               if (profiler is not None):
+                   phase_time = profiler.start()
                move = self.player[i].getMove(silo=self.silo, t=current_time)
+               if (profiler is not None):
+                   profiler.stop('getMove', phase_time)
+                   phase_time = profiler.start()
                self.player[i].place(silo=self.silo, col=move, t=current_time)
+               if (profiler is not None):
+                   profiler.stop('place', phase_time)
             
-            current_time += 0.1
+            current_time += TICK
+            if (self.clock == 'event'):
+                if (profiler is not None):
+                    phase_time = profiler.start()
+                current_time = self.__skipIdleTime(current_time, start_time + GAMETIME)
+                if (profiler is not None):
+                    profiler.stop('skipIdleTime', phase_time)
             self.silo.refreshBoard(current_time=current_time)
         
-        print("================")
-        self.silo.printSilo()
-        print("================")
         winner = self.silo.isEndGame()
         score = self.silo.scoreBoard()
-        print(f"{'Winner '+ winner if winner != 'f' and winner != None else 'No one end Game'}")
-        print(score)
+        if (self.sink is not None):
+            self.sink.onEndGame(self.silo, winner, score)
         #Return which player win
         return winner, score
        
-    def trainAI(self, round):
+    # checkpoint_every / checkpoint_seconds: save the learnt profiles every N episodes / T seconds
+    # log: episode log (see replay.py) receiving every episode learnt, None for no log
+    def trainAI(self, round, workers:int=1, sync_interval:int=100, checkpoint_every:int=None, checkpoint_seconds:float=None, log:'EpisodeLog'=None, telemetry:'Telemetry'=None):
+        from tqdm import tqdm
+        from player import AIPlayer
         if (not isinstance(round, int)):
             raise ValueError("Round must have int type")
         if (all (type(player) != AIPlayer for player in self.player)):
             raise RuntimeError("train AI must have all player to be AIPlayer class")
+        if (workers < 1 or sync_interval < 1):
+            raise ValueError("workers and sync interval must be at least 1")
+        self.__checkpoint_every = checkpoint_every
+        self.__checkpoint_seconds = checkpoint_seconds
+        self.__checkpoint_episode = 0
+        self.__checkpoint_time = time.time()
+        self.__log = log
+        self.__telemetry = telemetry
         train_count = {self.player[0].name: {'win':0, 'lose':0, 'draw':0}, self.player[1].name:  {'win':0, 'lose':0, 'draw':0}}
         try:
-            for i in tqdm(range(round)):
-                sys.stdout = open(os.devnull, 'w')
-                print("======= Round {} =======".format(i))
-                winner, score = self.start()
-                
-                for i in range(2):
-                    reward = self.player[i].feedReward(winner=winner, score=score)
-                    print(f"{self.player[i].name} : {reward}")
-
-                    if (reward == 1):
-                        train_count[self.player[i].name]['draw'] += 1
-                    elif (reward >= 1):
-                        train_count[self.player[i].name]['win'] += 1     
-                    elif (reward <= 1):
-                        train_count[self.player[i].name]['lose'] += 1
-
-                    self.player[i].reset()
-                # input()
-                # time.sleep(0.5)
-                sys.stdout = sys.__stdout__
+            if (workers > 1):
+                self.__trainParallel(round, workers, sync_interval, train_count, log, telemetry)
+            else:
+                for i in tqdm(range(round)):
+                    winner, score = self.start()
+                    
+                    for p in range(2):
+                        profile, states = self.player[p].getEpisode()
+                        reward = self.player[p].getReward(winner=winner, score=score)
+                        change, new_states = self.player[p].learn(profile, states, reward)
+                        if (log is not None):
+                            log.append(profile, states, winner, score, self.player[p].marker, reward)
+                        if (telemetry is not None):
+                            telemetry.record(self.player[p].marker, profile, reward, len(states), change, new_states)
+                        if (self.sink is not None):
+                            self.sink.onReward(self.player[p], reward)
+                        Robocon2024Game.__countReward(train_count[self.player[p].name], reward)
+                        if (self.profiler is not None):
+                            phase_time = self.profiler.start()
+                        self.player[p].reset()
+                        if (self.profiler is not None):
+                            self.profiler.stop('reset', phase_time)
+                    self.__checkpoint(i + 1)
+                    self.__emitTelemetry(i + 1)
             
+            self.__emitTelemetry(round, force=True)
             print(train_count)
             print("Saving Policy...")
+            if (self.profiler is not None):
+                phase_time = self.profiler.start()
             self.player[0].savePolicy()
             self.player[1].savePolicy()
+            if (self.profiler is not None):
+                self.profiler.stop('savePolicy', phase_time)
+                print(self.profiler.report())
         except KeyboardInterrupt:
-            sys.stdout = sys.__stdout__
             print(train_count)
             print("Trying to save player policy before end..")
             try:
@@ -88,16 +150,185 @@ class Robocon2024Game:
             except Exception as e:
                 print(traceback.format_exc())
                 print(e)
+            if (self.profiler is not None):
+                print(self.profiler.report())
+
+    # Save the profiles learnt since the last checkpoint when enough episodes or time passed
+    def __checkpoint(self, episode:int) -> None:
+        from tqdm import tqdm
+        if ((self.__checkpoint_every is not None and episode - self.__checkpoint_episode >= self.__checkpoint_every) or
+            (self.__checkpoint_seconds is not None and time.time() - self.__checkpoint_time >= self.__checkpoint_seconds)):
+            if (self.profiler is not None):
+                phase_time = self.profiler.start()
+            saved = self.player[0].savePolicy() + self.player[1].savePolicy()
+            # The log holds at least the episodes of the saved models
+            if (self.__log is not None):
+                self.__log.flush()
+            if (self.profiler is not None):
+                self.profiler.stop('checkpoint', phase_time)
+            tqdm.write("Checkpoint at episode {}: saved {} profiles".format(episode, len(saved)))
+            self.__checkpoint_episode = episode
+            self.__checkpoint_time = time.time()
+
+    # Emit the training figures when enough episodes passed, or whenever new episodes were played with force
+    def __emitTelemetry(self, episode:int, force:bool=False) -> None:
+        if (self.__telemetry is None):
+            return
+        if (self.__telemetry.due(episode) or (force == True and episode > self.__telemetry.last_episode)):
+            # Each player learns in its own tables, they are merged on save
+            entries = {}
+            for player in self.player:
+                for profile, count in player.getEntries().items():
+                    entries[profile] = max(entries.get(profile, 0), count)
+            self.__telemetry.emit(episode, entries)
+
+    @staticmethod
+    def __countReward(count:dict, reward:int) -> None:
+        if (reward == 1):
+            count['draw'] += 1
+        elif (reward >= 1):
+            count['win'] += 1     
+        elif (reward <= 1):
+            count['lose'] += 1
+
+    # Self-play with worker processes, every worker plays sync_interval episodes on its copy of the players,
+    # then the episodes are learnt here in worker order and the updated profiles are sent back to the workers
+    def __trainParallel(self, round:int, workers:int, sync_interval:int, train_count:dict, log:'EpisodeLog', telemetry:'Telemetry') -> None:
+        import multiprocessing
+        from tqdm import tqdm
+        outbox = multiprocessing.Queue()
+        inboxes = [multiprocessing.Queue() for _ in range(workers)]
+        # Every worker plays with its own stream, spawned from the stream of the game
+        streams = self.rng.spawn(workers)
+        processes = [multiprocessing.Process(target=_trainWorker, args=(self.player, self.clock, streams[i], self.profiler is not None, inboxes[i], outbox, i), daemon=True) for i in range(workers)]
+        for process in processes:
+            process.start()
+
+        # Keys learnt in each profile since the workers last received them, in the order they were last learnt
+        updated = [{}, {}]
+        remaining = round
+        try:
+            with tqdm(total=round) as progress:
+                while remaining > 0:
+                    # Every worker receives the same changes
+                    policies = [self.player[p].getPolicyChanges(updated[p]) for p in range(2)]
+                    updated = [{}, {}]
+                    tasks = []
+                    for i in range(workers):
+                        episodes = min(sync_interval, remaining)
+                        if (episodes == 0):
+                            break
+                        remaining -= episodes
+                        tasks.append(i)
+                        inboxes[i].put((episodes, policies))
+
+                    results = {}
+                    for _ in tasks:
+                        worker, episodes, snapshot = outbox.get()
+                        results[worker] = episodes
+                        if (self.profiler is not None):
+                            self.profiler.merge(snapshot)
+                    for i in tasks:
+                        for winner, score, episode in results[i]:
+                            for p in range(2):
+                                profile, states, reward = episode[p]
+                                change, new_states = self.player[p].learn(profile, states, reward)
+                                if (log is not None):
+                                    log.append(profile, states, winner, score, self.player[p].marker, reward)
+                                if (telemetry is not None):
+                                    telemetry.record(self.player[p].marker, profile, reward, len(states), change, new_states)
+                                if (self.sink is not None):
+                                    self.sink.onReward(self.player[p], reward)
+                                keys = updated[p].setdefault(profile, {})
+                                for state in reversed(states):
+                                    keys.pop(state, None)
+                                    keys[state] = None
+                                Robocon2024Game.__countReward(train_count[self.player[p].name], reward)
+                        progress.update(len(results[i]))
+                    self.__checkpoint(round - remaining)
+                    self.__emitTelemetry(round - remaining)
+        finally:
+            for inbox in inboxes:
+                inbox.put(None)
+            for process in processes:
+                process.join(timeout=1)
+                if (process.is_alive()):
+                    process.terminate()
+
+# Worker process of the parallel training, it learns nothing and sends back the played episodes
+# profile: time the phases of the games, the figures are sent back with the episodes
+def _trainWorker(player:list, clock:str, rng:'BlockRandom', profile:bool, inbox, outbox, worker:int) -> None:
+    import signal
+    from profiling import Profiler
+    # Ctrl-C is handled by the main process, which saves the policy
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # The workers do not report any game event
+    profiler = Profiler() if profile == True else None
+    game = Robocon2024Game(player, clock=clock, rng=rng, profiler=profiler)
+    while True:
+        task = inbox.get()
+        if (task is None):
+            break
+        episodes, policies = task
+        for p in range(2):
+            player[p].updatePolicy(policies[p])
+
+        results = []
+        for _ in range(episodes):
+            winner, score = game.start()
+            episode = []
+            for p in range(2):
+                profile, states = player[p].getEpisode()
+                episode.append((profile, states, player[p].getReward(winner=winner, score=score)))
+                player[p].reset()
+            results.append((winner, score, episode))
+        outbox.put((worker, results, profiler.snapshot() if profiler is not None else None))
+        if (profiler is not None):
+            profiler.reset()
 
 
 if (__name__ == "__main__"):
+    # benchmark.py and evaluate.py import this module, so they are only imported when run as a script
+    # The sub-commands import what they run, the choices of their arguments are repeated here
+    # so that parsing them imports neither evaluate.py (which imports this module again) nor solver.py
+    OPPONENTS = ('random', 'greedy') # solver.OPPONENTS
+    EVALUATION_OPPONENTS = ('random', 'greedy', 'ai') # evaluate.OPPONENTS
+    BACKENDS = ('dense', 'sparse') # policy.BACKENDS
+    BENCHMARKS = ('games', 'decisions', 'updates', 'silo', 'policy') # benchmark.BENCHMARKS
     parser = ArgumentParser(description="Robocon 2024 AI Training")
 
     subparsers = parser.add_subparsers(dest="mode", required=True, help="sub commands")
     train_parser = subparsers.add_parser("train", help="AI Training")
     play_parser = subparsers.add_parser("play", help="Play a game")
+    subparsers.add_parser("migrate", help="Convert models saved with string keys to integer keys")
+    subparsers.add_parser("fold", help="Fold the models into the canonical orientation used by --symmetric")
+    replay_parser = subparsers.add_parser("replay", help="Learn the episodes of a log again, without playing")
+    serve_parser = subparsers.add_parser("serve", help="Serve the decisions of one profile to the robot over a socket")
+    evaluate_parser = subparsers.add_parser("evaluate", help="Play the trained models, frozen, over a grid of settings")
+    bench_parser = subparsers.add_parser("bench", help="Measure the speed of the simulator and the learner")
+    solve_parser = subparsers.add_parser("solve", help="Compute the models by dynamic programming instead of self-play")
+    export_parser = subparsers.add_parser("export", help="Compile the models into read-only policies for the robot")
+    compact_parser = subparsers.add_parser("compact", help="Prune and quantize the models, with their win rates before and after")
+    startup_parser = subparsers.add_parser("startup", help="Measure the start time of a command of this program")
 
     train_parser.add_argument("--iteration",type=int, help="Numbers of epoch would like to train", dest="epoch", default=10000)
+    train_parser.add_argument("--backend", choices=BACKENDS, help="Q-table storage, 'dense' float32 array or 'sparse' dict", default='sparse')
+    train_parser.add_argument("--cache-size", type=int, help="Numbers of profiles kept open by each AI player (default: no limit)", dest="cache_size")
+    train_parser.add_argument("--max-entries", type=int, help="States kept in each sparse table, the least recently updated ones are dropped (default: no limit)", dest="max_entries")
+    train_parser.add_argument("--seed", type=int, help="seed of the random numbers, to reproduce a run")
+    train_parser.add_argument("--log", help="Append the episodes learnt to a binary log, to learn them again with replay")
+    train_parser.add_argument("--telemetry", help="Print the training figures and append them to a CSV or JSON lines (.jsonl) file ('-' to only print them)")
+    train_parser.add_argument("--telemetry-every", type=int, help="Episodes between two emissions of the training figures", dest="telemetry_every", default=1000)
+    train_parser.add_argument("--telemetry-window", type=int, help="Last games of each player and profile the rolling win rates are computed on", dest="telemetry_window", default=1000)
+    train_parser.add_argument("--profile", action="store_true", help="time the phases of the games and report them at the end")
+    train_parser.add_argument("--symmetric", action="store_true", help="look up and learn mirrored boards in one orientation")
+    train_parser.add_argument("--events", help="Append the game events to a JSON lines file ('-' for stdout)")
+    train_parser.add_argument("--clock", choices=CLOCKS, help="game clock, 'tick' steps every 0.1s, 'event' skips idle ticks", default='event')
+    train_parser.add_argument("--workers", type=int, help="Numbers of worker processes playing the episodes", default=1)
+    train_parser.add_argument("--sync-interval", type=int, help="Episodes played by each worker before the policies are merged", dest="sync_interval", default=100)
+    train_parser.add_argument("--checkpoint-every", type=int, help="Save the learnt profiles every N episodes", dest="checkpoint_every")
+    train_parser.add_argument("--checkpoint-seconds", type=float, help="Save the learnt profiles every T seconds", dest="checkpoint_seconds")
     train_parser.add_argument("--rs", type=int, help="red player speed (from 0 to 18)", dest="red_player_speed")
     train_parser.add_argument("--rf", type=int, help="red player start time (from 0 to 170)", dest="red_player_freeze_time")
     train_parser.add_argument("--rr", type=float, help="red player success rate (from 0.7 to 1.0)", dest="red_player_rate")
@@ -105,11 +336,89 @@ if (__name__ == "__main__"):
     train_parser.add_argument("--bf", type=int, help="blue player start time (from 0 to 170)", dest="blue_player_freeze_time")
     train_parser.add_argument("--br", type=float, help="blue player success rate (from 0.7 to 1.0)", dest="blue_player_rate")
 
-    play_parser.add_argument("--r", type=int, help="red player (0: AI/1: player)", dest="red_player", required=True)
+    solve_parser.add_argument("--speed", type=int, nargs='+', help="speeds of the profiles to solve (default: 0 to 18)", default=list(range(0, 19)))
+    solve_parser.add_argument("--rate", type=float, nargs='+', help="success rates of the profiles to solve (default: 0.7 0.8 0.9 1.0)", default=[0.7, 0.8, 0.9, 1.0])
+    solve_parser.add_argument("--opponent", choices=OPPONENTS, help="opponent drops in a 'random' column or the 'greedy' column worst for the player", default='random')
+    solve_parser.add_argument("--os", type=float, help="opponent speed (from 0 to 18)", dest="opponent_speed", default=9)
+    solve_parser.add_argument("--or", type=float, help="opponent success rate (from 0.7 to 1.0)", dest="opponent_rate", default=0.85)
+    solve_parser.add_argument("--backend", choices=BACKENDS, help="Q-table storage, 'dense' float32 array or 'sparse' dict", default='dense')
+
+    export_parser.add_argument("--speed", type=int, nargs='+', help="speeds of the profiles to export (default: every model)")
+    export_parser.add_argument("--rate", type=float, nargs='+', help="success rates of the profiles to export (default: every model)")
+    export_parser.add_argument("--output", help="directory of the exported policies", default="policies")
+    export_parser.add_argument("--backend", choices=BACKENDS, help="Q-table storage used to read the models", default='dense')
+    export_parser.add_argument("--symmetric", action="store_true", help="the models were learnt with --symmetric")
+
+    compact_parser.add_argument("--speed", type=int, nargs='+', help="speeds of the profiles to compact (default: every model)")
+    compact_parser.add_argument("--rate", type=float, nargs='+', help="success rates of the profiles to compact (default: every model)")
+    compact_parser.add_argument("--output", help="directory of the compacted models, './models' to compact them in place", default="models_compact")
+    compact_parser.add_argument("--threshold", type=float, help="values within this distance of 0 are pruned", default=1e-3)
+    compact_parser.add_argument("--dtype", choices=('float16', 'int8'), help="storage of the values, int8 with a scale per profile", default='int8')
+    compact_parser.add_argument("--max-entries", type=int, help="keep the entries with the largest values of each profile", dest="max_entries")
+    compact_parser.add_argument("--games", type=int, help="games of the win rates before and after against the opponent, 0 to skip them", default=1000)
+    compact_parser.add_argument("--opponent", choices=('random', 'greedy'), help="opponent of the win rates", default='random')
+    compact_parser.add_argument("--seed", type=int, help="seed of the games of the win rates", default=0)
+
+    startup_parser.add_argument("arguments", nargs='*', help="command line to measure (default: --help)", default=['--help'])
+    startup_parser.add_argument("--runs", type=int, help="Numbers of runs of the command", default=10)
+    startup_parser.add_argument("--imports", type=int, help="Numbers of slowest imports to show", default=10)
+
+    replay_parser.add_argument("--log", help="episode log written by train --log", required=True)
+    replay_parser.add_argument("--learning-rate", type=float, help="learning rate of the backups", dest="learning_rate", default=0.2)
+    replay_parser.add_argument("--gamma", type=float, help="decay gamma of the backups", default=0.9)
+    replay_parser.add_argument("--backend", choices=BACKENDS, help="Q-table storage, 'dense' float32 array or 'sparse' dict", default='sparse')
+    replay_parser.add_argument("--cache-size", type=int, help="Numbers of profiles kept open (default: no limit)", dest="cache_size")
+    replay_parser.add_argument("--output", help="directory without models the episodes are learnt into, from empty tables", default="models_replay")
+
+    serve_parser.add_argument("--speed", type=int, help="speed of the robot (from 0 to 18)", required=True)
+    serve_parser.add_argument("--rate", type=float, help="success rate of the robot (from 0.7 to 1.0)", required=True)
+    serve_parser.add_argument("--marker", choices=('r', 'b'), help="colour of the robot", required=True)
+    serve_parser.add_argument("--unix", help="path of a Unix socket to listen on, instead of TCP")
+    serve_parser.add_argument("--host", help="TCP address to listen on", default='127.0.0.1')
+    serve_parser.add_argument("--port", type=int, help="TCP port to listen on", default=8765)
+    serve_parser.add_argument("--budget-ms", type=float, help="latency budget of a decision, slower ones are flagged late", dest="budget_ms", default=1.0)
+    serve_parser.add_argument("--backend", choices=BACKENDS, help="Q-table storage, 'dense' float32 array or 'sparse' dict", default='dense')
+    serve_parser.add_argument("--symmetric", action="store_true", help="look up mirrored boards in one orientation")
+
+    evaluate_parser.add_argument("--speed", type=int, nargs='+', help="speeds of the AI player (default: 0 to 18)", default=list(range(0, 19)))
+    evaluate_parser.add_argument("--rate", type=float, nargs='+', help="success rates of the AI player (default: 0.7 0.8 0.9 1.0)", default=[0.7, 0.8, 0.9, 1.0])
+    evaluate_parser.add_argument("--freeze", type=int, nargs='+', help="zone 3 start times of the AI player (default: 0)", default=[0])
+    evaluate_parser.add_argument("--opponent", choices=EVALUATION_OPPONENTS, help="opponent: 'random' or 'greedy' baseline, or a frozen 'ai' player", default='random')
+    evaluate_parser.add_argument("--os", type=int, help="opponent speed (from 0 to 18, default: random every game)", dest="opponent_speed")
+    evaluate_parser.add_argument("--of", type=int, help="opponent zone 3 start time (from 0 to 170, default: random every game)", dest="opponent_freeze_time")
+    evaluate_parser.add_argument("--or", type=float, help="opponent success rate (from 0.7 to 1.0, default: random every game)", dest="opponent_rate")
+    evaluate_parser.add_argument("--games", type=int, help="games played in every cell", default=1000)
+    evaluate_parser.add_argument("--workers", type=int, help="Numbers of worker processes playing the cells", default=1)
+    evaluate_parser.add_argument("--output", help="CSV file of the results, one row per cell", default="evaluation.csv")
+    evaluate_parser.add_argument("--backend", choices=BACKENDS, help="Q-table storage, 'dense' float32 array or 'sparse' dict", default='sparse')
+    evaluate_parser.add_argument("--symmetric", action="store_true", help="look up mirrored boards in one orientation")
+    evaluate_parser.add_argument("--clock", choices=CLOCKS, help="game clock, 'tick' steps every 0.1s, 'event' skips idle ticks", default='event')
+    evaluate_parser.add_argument("--seed", type=int, help="seed of the random numbers, to reproduce a run")
+
+    bench_parser.add_argument("--benchmarks", nargs='+', choices=BENCHMARKS, help="benchmarks to run: games, decisions, updates, silo, policy (default: all)")
+    bench_parser.add_argument("--output", help="JSON file of the results", default="benchmark.json")
+    bench_parser.add_argument("--compare", help="baseline JSON file, regressions are reported and the exit code is 1")
+    bench_parser.add_argument("--threshold", type=float, help="relative change counted as a regression", default=0.1)
+    bench_parser.add_argument("--min-time", type=float, help="seconds each speed measurement runs", dest="min_time", default=2)
+    bench_parser.add_argument("--sizes", type=int, nargs='+', help="entries of the synthetic Q-tables of the policy benchmark (default: 10000 100000 1000000)")
+    bench_parser.add_argument("--backend", choices=BACKENDS, help="Q-table storage of the AI players", default='sparse')
+    bench_parser.add_argument("--seed", type=int, help="seed of the random numbers", default=0)
+
+    play_parser.add_argument("--r", type=int, help="red player (0: AI/1: player/2: search)", dest="red_player", required=True)
+    play_parser.add_argument("--backend", choices=BACKENDS, help="Q-table storage, 'dense' float32 array or 'sparse' dict", default='sparse')
+    play_parser.add_argument("--budget-ms", type=float, help="search time of a search player per decision", dest="budget_ms", default=80)
+    play_parser.add_argument("--rollouts", type=int, help="rollouts of a search player per decision, instead of --budget-ms, to reproduce a seeded game")
+    play_parser.add_argument("--frozen", help="AI players play the policies exported to this directory, without reading the models")
+    play_parser.add_argument("--prior", action="store_true", help="search players use the AI models as a prior")
+    play_parser.add_argument("--cache-size", type=int, help="Numbers of profiles kept open by each AI player (default: no limit)", dest="cache_size")
+    play_parser.add_argument("--seed", type=int, help="seed of the random numbers, to reproduce a run")
+    play_parser.add_argument("--symmetric", action="store_true", help="look up and learn mirrored boards in one orientation")
+    play_parser.add_argument("--events", help="Append the game events to a JSON lines file ('-' for stdout)")
+    play_parser.add_argument("--clock", choices=CLOCKS, help="game clock, 'tick' steps every 0.1s, 'event' skips idle ticks", default='event')
     play_parser.add_argument("--rs", type=int, help="red player speed (from 0 to 18)", dest="red_player_speed")
     play_parser.add_argument("--rf", type=int, help="red player zone 3 start time (from 0 to 170)", dest="red_player_freeze_time")
     play_parser.add_argument("--rr", type=float, help="red player success rate (from 0.7 to 1.0)", dest="red_player_rate")
-    play_parser.add_argument("--b", type=int, help="blue player (0: AI/1: player)", dest="blue_player", required=True)
+    play_parser.add_argument("--b", type=int, help="blue player (0: AI/1: player/2: search)", dest="blue_player", required=True)
     play_parser.add_argument("--bs", type=int, help="blue player speed (from 0 to 18)", dest="blue_player_speed")
     play_parser.add_argument("--bf", type=int, help="blue player zone 3 start time (from 0 to 170)", dest="blue_player_freeze_time")
     play_parser.add_argument("--br", type=float, help="blue player success rate (from 0.7 to 1.0)", dest="blue_player_rate")
@@ -117,21 +426,153 @@ if (__name__ == "__main__"):
     opt = parser.parse_args()
 
     if(opt.mode == "train"):
+        from player import AIPlayer
+        from profiling import Profiler
+        from rng import BlockRandom
+        rng = BlockRandom(opt.seed)
         players = [
-            AIPlayer('Red','r', 0.8, speed=opt.red_player_speed, freeze_time=opt.red_player_freeze_time, success_rate=opt.red_player_rate, verbose=True),
-            AIPlayer('Blue','b', 0.8, speed=opt.blue_player_speed, freeze_time=opt.blue_player_freeze_time, success_rate=opt.blue_player_rate, verbose=True)
+            AIPlayer('Red','r', 0.8, speed=opt.red_player_speed, freeze_time=opt.red_player_freeze_time, success_rate=opt.red_player_rate, verbose=False, backend=opt.backend, cache_size=opt.cache_size, symmetric=opt.symmetric, rng=rng, max_entries=opt.max_entries),
+            AIPlayer('Blue','b', 0.8, speed=opt.blue_player_speed, freeze_time=opt.blue_player_freeze_time, success_rate=opt.blue_player_rate, verbose=False, backend=opt.backend, cache_size=opt.cache_size, symmetric=opt.symmetric, rng=rng, max_entries=opt.max_entries)
         ]
-        game = Robocon2024Game(players)
-        game.trainAI(opt.epoch)
+        from events import JsonLinesSink
+        from replay import EpisodeLog
+        from telemetry import Telemetry
+        sink = JsonLinesSink(opt.events) if opt.events is not None else None
+        game = Robocon2024Game(players, clock=opt.clock, sink=sink, rng=rng, profiler=Profiler() if opt.profile == True else None)
+        log = EpisodeLog(opt.log) if opt.log is not None else None
+        telemetry = Telemetry(opt.telemetry if opt.telemetry != '-' else None, every=opt.telemetry_every, window=opt.telemetry_window) if opt.telemetry is not None else None
+        game.trainAI(opt.epoch, workers=opt.workers, sync_interval=opt.sync_interval, checkpoint_every=opt.checkpoint_every, checkpoint_seconds=opt.checkpoint_seconds, log=log, telemetry=telemetry)
+        if (sink is not None):
+            sink.close()
+        if (log is not None):
+            log.close()
+        if (telemetry is not None):
+            telemetry.close()
 
     elif(opt.mode == "play"):
+        from events import ConsoleSink, JsonLinesSink, MultiSink
+        from policy import PolicyStore
+        from player import AIPlayer, FrozenAIPlayer, HumanPlayer
+        from rng import BlockRandom
+        from search import SearchPlayer
+        rng = BlockRandom(opt.seed)
+        prior = PolicyStore('./models', opt.backend, cache_size=opt.cache_size) if opt.prior == True else None
         players = []
-        if (opt.red_player == 0):
-            players.append(AIPlayer('com_1','r', speed=opt.red_player_speed, freeze_time=opt.red_player_freeze_time, success_rate=opt.red_player_rate, verbose=True))
+        if (opt.red_player == 0 and opt.frozen is not None):
+            players.append(FrozenAIPlayer('com_1','r', directory=opt.frozen, speed=opt.red_player_speed, freeze_time=opt.red_player_freeze_time, success_rate=opt.red_player_rate, rng=rng, verbose=True))
+        elif (opt.red_player == 0):
+            players.append(AIPlayer('com_1','r', speed=opt.red_player_speed, freeze_time=opt.red_player_freeze_time, success_rate=opt.red_player_rate, verbose=True, backend=opt.backend, cache_size=opt.cache_size, symmetric=opt.symmetric, rng=rng))
         elif (opt.red_player == 1):
-            players.append(HumanPlayer('1','r', speed=opt.red_player_speed, freeze_time=opt.red_player_freeze_time, success_rate=opt.red_player_rate))
-        if (opt.blue_player == 0):
-            players.append(AIPlayer('com_2','b', speed=opt.blue_player_speed, freeze_time=opt.blue_player_freeze_time, success_rate=opt.blue_player_rate, verbose=True))
+            players.append(HumanPlayer('1','r', speed=opt.red_player_speed, freeze_time=opt.red_player_freeze_time, success_rate=opt.red_player_rate, rng=rng, verbose=True))
+        elif (opt.red_player == 2):
+            players.append(SearchPlayer('search_1','r', speed=opt.red_player_speed, freeze_time=opt.red_player_freeze_time, success_rate=opt.red_player_rate, rng=rng, budget=opt.budget_ms / 1000, rollouts=opt.rollouts, prior=prior, verbose=True))
+        if (opt.blue_player == 0 and opt.frozen is not None):
+            players.append(FrozenAIPlayer('com_2','b', directory=opt.frozen, speed=opt.blue_player_speed, freeze_time=opt.blue_player_freeze_time, success_rate=opt.blue_player_rate, rng=rng, verbose=True))
+        elif (opt.blue_player == 0):
+            players.append(AIPlayer('com_2','b', speed=opt.blue_player_speed, freeze_time=opt.blue_player_freeze_time, success_rate=opt.blue_player_rate, verbose=True, backend=opt.backend, cache_size=opt.cache_size, symmetric=opt.symmetric, rng=rng))
         elif (opt.blue_player == 1):
-            players.append(HumanPlayer('2','b', speed=opt.blue_player_speed, freeze_time=opt.blue_player_freeze_time, success_rate=opt.blue_player_rate))
-        Robocon2024Game(players).start()
+            players.append(HumanPlayer('2','b', speed=opt.blue_player_speed, freeze_time=opt.blue_player_freeze_time, success_rate=opt.blue_player_rate, rng=rng, verbose=True))
+        elif (opt.blue_player == 2):
+            players.append(SearchPlayer('search_2','b', speed=opt.blue_player_speed, freeze_time=opt.blue_player_freeze_time, success_rate=opt.blue_player_rate, rng=rng, budget=opt.budget_ms / 1000, rollouts=opt.rollouts, prior=prior, verbose=True))
+        sink = ConsoleSink()
+        if (opt.events is not None):
+            sink = MultiSink([sink, JsonLinesSink(opt.events)])
+        Robocon2024Game(players, clock=opt.clock, sink=sink, rng=rng).start()
+        sink.close()
+        for player in players:
+            if (isinstance(player, SearchPlayer)):
+                print("{}: {} rollouts, {:.0f} rollouts/s".format(player.name, player.rollouts, player.rolloutsPerSecond()))
+
+    elif(opt.mode == "migrate"):
+        from policy import migrateModels
+        if (os.path.exists('models')):
+            for filename in migrateModels('./models'):
+                print("Migrated {}".format(filename))
+
+    elif(opt.mode == "fold"):
+        from policy import foldModels
+        if (os.path.exists('models')):
+            for profile in foldModels('./models'):
+                print("Folded profile {}".format(profile))
+
+    elif(opt.mode == "replay"):
+        from replay import replayLog
+        start_time = time.time()
+        try:
+            episodes = replayLog(opt.log, opt.output, backend=opt.backend, learning_rate=opt.learning_rate, decay_gamma=opt.gamma, cache_size=opt.cache_size)
+        except ValueError as e:
+            replay_parser.error(str(e))
+        print("Replayed {} episodes in {:.1f}s".format(episodes, time.time() - start_time))
+
+    elif(opt.mode == "serve"):
+        import asyncio
+        from server import PolicyServer
+        server = PolicyServer('./models', opt.speed, opt.rate, opt.marker, backend=opt.backend, symmetric=opt.symmetric, budget_ms=opt.budget_ms)
+        print("Serving profile {} on {}".format(server.profile, opt.unix if opt.unix is not None else "{}:{}".format(opt.host, opt.port)))
+        try:
+            asyncio.run(server.serve(path=opt.unix, host=opt.host, port=opt.port))
+        except KeyboardInterrupt:
+            print(server.stats())
+
+    elif(opt.mode == "evaluate"):
+        from tqdm import tqdm
+        from evaluate import gridTasks, evaluate
+        tasks = gridTasks(opt.speed, opt.rate, opt.freeze, opponent=opt.opponent, opponent_speed=opt.opponent_speed, opponent_success_rate=opt.opponent_rate, opponent_freeze_time=opt.opponent_freeze_time,
+                          games=opt.games, clock=opt.clock, backend=opt.backend, symmetric=opt.symmetric, seed=opt.seed)
+        with tqdm(total=len(tasks)) as progress:
+            evaluate(tasks, opt.output, workers=opt.workers, progress=progress)
+
+    elif(opt.mode == "bench"):
+        from benchmark import DEFAULT_SIZES, runBenchmarks, saveReport, loadReport, compareReports, printReport
+        report = runBenchmarks(opt.benchmarks if opt.benchmarks is not None else BENCHMARKS, min_time=opt.min_time, seed=opt.seed, backend=opt.backend, sizes=opt.sizes if opt.sizes is not None else DEFAULT_SIZES)
+        saveReport(opt.output, report)
+        baseline = loadReport(opt.compare) if opt.compare is not None else None
+        printReport(report, baseline)
+        if (baseline is not None):
+            regressions = compareReports(report, baseline, opt.threshold)
+            for name, base, value, change in regressions:
+                print("Regression {}: {:.4g} -> {:.4g} ({:.0%} worse)".format(name, base, value, change))
+            if (len(regressions) > 0):
+                sys.exit(1)
+
+    elif(opt.mode == "solve"):
+        from policy import saveTable, getProfile, toBackend
+        from solver import solveProfile
+        if (not os.path.exists('models')):
+            os.mkdir('models')
+        for speed in opt.speed:
+            for rate in opt.rate:
+                start_time = time.time()
+                table = solveProfile(speed, rate, opponent_speed=opt.opponent_speed, opponent_success_rate=opt.opponent_rate, opponent=opt.opponent)
+                saveTable('./models', getProfile(speed, rate), toBackend(table, opt.backend))
+                print("Solved profile {} in {:.1f}s".format(getProfile(speed, rate), time.time() - start_time))
+
+    elif(opt.mode == "export"):
+        from policy import PolicyStore
+        from frozen import exportPolicy
+        for profile in sorted(PolicyStore('./models', opt.backend).profiles()):
+            speed, success_rate = profile[1:].split('_R')
+            if ((opt.speed is not None and int(speed) not in opt.speed) or (opt.rate is not None and float(success_rate) not in opt.rate)):
+                continue
+            print("Exported profile {} to {}".format(profile, exportPolicy('./models', profile, opt.output, backend=opt.backend, symmetric=opt.symmetric)))
+
+    elif(opt.mode == "compact"):
+        from policy import listProfiles
+        from compact import compactProfile
+        for profile in sorted(listProfiles('./models')):
+            speed, success_rate = profile[1:].split('_R')
+            if ((opt.speed is not None and int(speed) not in opt.speed) or (opt.rate is not None and float(success_rate) not in opt.rate)):
+                continue
+            figures = compactProfile('./models', opt.output, profile, threshold=opt.threshold, dtype=opt.dtype, max_entries=opt.max_entries, games=opt.games, opponent=opt.opponent, seed=opt.seed)
+            line = "{}: {} -> {} entries, {:.1f} -> {:.1f} KB".format(profile, figures['entries_before'], figures['entries_after'], figures['bytes_before'] / 1024, figures['bytes_after'] / 1024)
+            if (figures['win_rate_before'] is not None):
+                line += ", win rate {:.3f} -> {:.3f}".format(figures['win_rate_before'], figures['win_rate_after'])
+            print(line)
+
+    elif(opt.mode == "startup"):
+        from startup import measureStartup, importTimes
+        command = [os.path.abspath(__file__)] + opt.arguments
+        times = measureStartup(command, runs=opt.runs)
+        print("{} runs of {}: min {:.0f} ms, median {:.0f} ms, max {:.0f} ms".format(len(times), ' '.join(opt.arguments), 1000 * min(times), 1000 * sorted(times)[len(times) // 2], 1000 * max(times)))
+        for name, seconds in importTimes(command, top=opt.imports):
+            print("{:>8.1f} ms  {}".format(1000 * seconds, name))
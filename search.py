@@ -0,0 +1,110 @@
+import math
+import time
+from silo import VirtualSilo
+from player import Player
+from policy import encodeKey, getProfile
+from rng import BlockRandom
+
+GAMETIME = 180 # same as Robocon2024Game
+TICK = 0.1
+
+# Player searching its move with Monte Carlo rollouts from the current silo, within a time budget
+# Every column is a bandit arm chosen by UCB1: a rollout drops the paddy rice of the arm, then both robots
+# drop in random columns with their speed and success rate until the end of the game, and the arm
+# gets the reward of AIPlayer.getReward. The pending placements of the silo land as in the game.
+# The opponent is unknown to the player, it is modelled by opponent_speed and opponent_success_rate.
+# rollouts: fixed number of rollouts per decision instead of the time budget, so that a seeded game is reproduced
+# prior: optional PolicyStore of the AI models, the values of the profile add a bonus to the arms that fades with their visits
+class SearchPlayer(Player):
+    def __init__(self, name:str, marker:str, speed:int=None, freeze_time:int=None, success_rate:float=None, rng:BlockRandom=None,
+                 budget:float=0.08, rollouts:int=None, opponent_speed:float=9, opponent_success_rate:float=0.85, prior=None, prior_weight:float=1.0, exploration:float=1.4, verbose:bool=False) -> None:
+        super(SearchPlayer, self).__init__(name, marker, speed=speed, freeze_time=freeze_time, success_rate=success_rate, rng=rng, verbose=verbose)
+        self.budget = budget # seconds of search per decision
+        self.rollouts_per_decision = rollouts
+        self.opponent_speed = opponent_speed
+        self.opponent_success_rate = opponent_success_rate
+        self.prior = prior
+        self.prior_weight = prior_weight
+        self.exploration = exploration
+        # The rollouts draw from their own stream, spawned from rng: how many they play depends on the wall clock,
+        # and they would shift every later draw of the game stream
+        self.search_rng = self.rng.spawn(1)[0]
+        # Rollouts played and seconds searched since the player was created
+        self.rollouts = 0
+        self.search_time = 0
+
+    def rolloutsPerSecond(self) -> float:
+        return self.rollouts / self.search_time if self.search_time > 0 else 0
+
+    def getMove(self, silo:VirtualSilo, t:float) -> int:
+        if (t < self._freeze_time):
+            return -1
+        available_actions = self._getNextAvailableMove(silo=silo, t=t)
+        if (len(available_actions) <= 1):
+            return -1
+        # The search always drops its paddy rice, the last available action is -1
+        columns = available_actions[:-1]
+        final_action = columns[0] if len(columns) == 1 else self.__search(silo, t, columns)
+        if (self.sink is not None):
+            self.sink.onDecision(self, t, available_actions, final_action)
+        return final_action
+
+    def __search(self, silo:VirtualSilo, t:float, columns:list) -> int:
+        start_time = time.perf_counter()
+        bonus = [0] * len(columns)
+        if (self.prior is not None):
+            table = self.prior[getProfile(self._speed, self._success_rate)]
+            code = silo.getSiloCode(self._marker)
+            bonus = [self.prior_weight * table.get(encodeKey(code, self.paddy_rice_alert, col), 0) for col in columns]
+        visits = [0] * len(columns)
+        total = [0] * len(columns)
+        played = 0
+        while True:
+            if (played < len(columns)):
+                arm = played
+            else:
+                log_played = math.log(played)
+                arm = max(range(len(columns)), key=lambda i: total[i] / visits[i] + self.exploration * math.sqrt(log_played / visits[i]) + bonus[i] / (1 + visits[i]))
+            total[arm] += self.__rollout(silo, t, columns[arm])
+            visits[arm] += 1
+            played += 1
+            if (played >= self.rollouts_per_decision if self.rollouts_per_decision is not None else time.perf_counter() - start_time >= self.budget):
+                break
+        self.rollouts += played
+        self.search_time += time.perf_counter() - start_time
+        best = max(range(len(columns)), key=lambda i: (total[i] / visits[i] if visits[i] > 0 else -math.inf, visits[i]))
+        return columns[best]
+
+    # Reward of one random game going on from the silo after dropping in the column
+    def __rollout(self, silo:VirtualSilo, t:float, col:int) -> int:
+        rng = self.search_rng
+        sim = silo.clone(rng=rng)
+        markers = (self._marker, 'b' if self._marker == 'r' else 'r')
+        speeds = (max(self._speed, TICK), max(self.opponent_speed, TICK))
+        success_rates = (self._success_rate, self.opponent_success_rate)
+
+        # The opponent acts again when its pending paddy rice lands, and holds what it did not place yet
+        pending = [land_time for land_time, marker, _ in sim.getPendingPlacements() if marker == markers[1]]
+        opponent_rice = Player.PADDY_RICE_NUM - sim.scoreBoard().get(markers[1], 0) // 30 - len(pending)
+        ready = [t + speeds[0], pending[0] if len(pending) > 0 else t]
+        rice = [self._paddy_rice - 1, opponent_rice]
+        if (rng.random() <= success_rates[0]):
+            sim.place(markers[0], col=col, next_place_time=ready[0])
+
+        while sim.isEndGame() is None:
+            current_time = min(ready[p] for p in range(2) if rice[p] > 0) if rice[0] > 0 or rice[1] > 0 else GAMETIME
+            if (current_time >= GAMETIME):
+                break
+            sim.step(current_time)
+            available = sim.getAvailableMove()
+            if (sim.isEndGame() is not None or len(available) == 0):
+                break
+            for p in range(2):
+                if (rice[p] > 0 and ready[p] <= current_time):
+                    ready[p] = current_time + speeds[p]
+                    rice[p] -= 1
+                    if (rng.random() <= success_rates[p]):
+                        sim.place(markers[p], col=available[rng.choice(len(available))], next_place_time=ready[p])
+        if (sim.isEndGame() is None):
+            sim.step(GAMETIME)
+        return self.getReward(winner=sim.isEndGame(), score=sim.scoreBoard())
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+import numpy as np
+from silo import Silo
+from player import Player
+from policy import ACTIONS, MIRROR_SLOTS, canonicalCode, getProfile, greedyActions, loadTable
+
+# Inference service for the real robot: the table of one profile is read once, then every request
+# carries a board snapshot from the sensors and gets the greedy action back, without the game clock
+#
+# Protocol: one JSON object per line in both directions
+#   {"board": [[5 columns of 3 cells, bottom first, "r" / "b" / null]], "paddy_rice": 8, "cooldown": false, "id": 1}
+#     -> {"action": 2, "latency_us": 35.1, "late": false, "id": 1}
+#   {"stats": true} -> latency statistics of the last requests
+# Errors are answered with {"error": message, "id": ...}, the connection stays open
+STATS_WINDOW = 10000
+
+class PolicyServer:
+    # budget_ms: decisions slower than the budget are flagged late and counted
+    def __init__(self, directory:str, speed:int, success_rate:float, marker:str, backend:str='dense', symmetric:bool=False, budget_ms:float=1.0) -> None:
+        self.profile = getProfile(speed, success_rate)
+        self.table = loadTable(directory, self.profile, backend)
+        if (self.table is None):
+            raise FileNotFoundError("No model of profile {} in {}".format(self.profile, directory))
+        self.marker = marker
+        self.success_rate = success_rate
+        self.symmetric = symmetric
+        self.budget = budget_ms / 1000
+        self.__silo = Silo()
+        self.__latencies = deque(maxlen=STATS_WINDOW)
+        self.requests = 0
+        self.late = 0
+
+    # Greedy action on the board, -1 when the robot is cooling down or has no paddy rice
+    def decide(self, board:list, paddy_rice:int, cooldown:bool=False) -> int:
+        self.__silo.updateBoard(board)
+        available_actions = self.__silo.getAvailableMove()
+        if (cooldown == True or paddy_rice <= 0 or len(available_actions) == 0):
+            return -1
+        code, mirrored = canonicalCode(self.__silo.getSiloCode(self.marker)) if self.symmetric == True else (self.__silo.getSiloCode(self.marker), False)
+        values = self.table.actionValues(code, paddy_rice <= Player.PADDY_RICE_NUM * self.success_rate)
+        if (mirrored == True):
+            values = values[MIRROR_SLOTS]
+        available = np.zeros(ACTIONS, dtype=bool)
+        available[np.array(available_actions + [-1]) + 1] = True
+        return int(greedyActions(values, available))
+
+    # Answer of one request
+    def handle(self, request:dict) -> dict:
+        if (not isinstance(request, dict)):
+            raise TypeError("a request must be a JSON object")
+        if (request.get('stats') == True):
+            return self.stats()
+        start_time = time.perf_counter()
+        action = self.decide(request['board'], int(request['paddy_rice']), bool(request.get('cooldown', False)))
+        latency = time.perf_counter() - start_time
+        self.__latencies.append(latency)
+        self.requests += 1
+        late = latency > self.budget
+        if (late == True):
+            self.late += 1
+        return {'action': action, 'latency_us': round(latency * 1e6, 1), 'late': late}
+
+    # Latency statistics in microseconds over the last STATS_WINDOW requests
+    def stats(self) -> dict:
+        stats = {'profile': self.profile, 'requests': self.requests, 'late': self.late, 'budget_us': self.budget * 1e6}
+        if (len(self.__latencies) > 0):
+            latencies = np.array(self.__latencies) * 1e6
+            stats.update({
+                'mean_us': float(latencies.mean()),
+                'p50_us': float(np.percentile(latencies, 50)),
+                'p99_us': float(np.percentile(latencies, 99)),
+                'max_us': float(latencies.max()),
+            })
+        return stats
+
+    async def __serveClient(self, reader:asyncio.StreamReader, writer:asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if (len(line) == 0):
+                    break
+                request = {}
+                try:
+                    request = json.loads(line)
+                    response = self.handle(request)
+                except (ValueError, KeyError, TypeError, IndexError, AttributeError) as e:
+                    response = {'error': str(e)}
+                if (isinstance(request, dict) and 'id' in request):
+                    response['id'] = request['id']
+                writer.write((json.dumps(response) + '\n').encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    # Serve on a Unix socket when path is given, on TCP otherwise, until cancelled
+    async def serve(self, path:str=None, host:str='127.0.0.1', port:int=8765) -> None:
+        if (path is not None):
+            if (os.path.exists(path)):
+                os.remove(path)
+            server = await asyncio.start_unix_server(self.__serveClient, path=path)
+        else:
+            server = await asyncio.start_server(self.__serveClient, host=host, port=port)
+        async with server:
+            await server.serve_forever()
@@ -1,19 +1,82 @@
 import heapq
-import numpy as np
+from rng import BlockRandom
 class Silo:
+    # Each column holds 0-3 paddy rice of two colours: 1 + 2 + 4 + 8 stacking configurations
+    COLUMN_STATES = 15
+    # Number of integer board codes, see getSiloCode
+    STATES = COLUMN_STATES ** 5
+    COLUMN_WEIGHTS = (1, 15, 225, 3375, 50625)
+
     def __init__(self) -> None:
         self._silo = [[None]*3 for _ in range(5)]
 
+        # Integer board code, kept up to date on every placement
+        # Code contributed by every rice as if it belongs to the opponent
+        self._occupancy_code = 0
+        # Extra code contributed by the rice of each marker
+        self._marker_code = {}
+
+        # Running aggregates of the board, kept up to date on every placement
+        self._cell_count = {}  # paddy rice of each marker
+        self._top_count = {}   # top row cells of each marker
+        self._mark_count = {}  # columns topped by a marker with its own paddy rice underneath ("Mark")
+        self._filled_tops = 0  # filled top row cells
+        self._winner = None    # marker with 3 Marks
+
     # Return from sensors data
     def updateBoard(self, values:list) -> None:
         if (len(values) != 5):
             raise ValueError('There should only be 5 columns')
-        if (len(values[0]) != 5):
+        if (any(len(column) != 3 for column in values)):
             raise ValueError('There should only be 3 rows')
         
         for i in range(5):
             for j in range(3):
                 self._silo[i][j] = values[i][j]
+        self._rebuild()
+
+    # Recompute the integer board code and the aggregates from the board
+    def _rebuild(self) -> None:
+        self._occupancy_code = 0
+        self._marker_code = {}
+        self._cell_count = {}
+        self._top_count = {}
+        self._mark_count = {}
+        self._filled_tops = 0
+        self._winner = None
+        for i in range(5):
+            for j in range(3):
+                if (self._silo[i][j] != None):
+                    self._addRice(i, j, self._silo[i][j])
+
+    # Put the paddy rice on top of the column, return False if the column is full
+    def _putRice(self, col:int, player:str) -> bool:
+        for i in range(3):
+            if (self._silo[col][i] == None):
+                self._silo[col][i] = player
+                self._addRice(col, i, player)
+                return True
+        return False
+
+    # Account the paddy rice placed in the cell
+    def _addRice(self, col:int, row:int, player:str) -> None:
+        weight = (1 << row) * Silo.COLUMN_WEIGHTS[col]
+        self._occupancy_code += weight
+        self._marker_code[player] = self._marker_code.get(player, 0) + weight
+        self._cell_count[player] = self._cell_count.get(player, 0) + 1
+        if (row != 2):
+            return
+        self._filled_tops += 1
+        self._top_count[player] = self._top_count.get(player, 0) + 1
+        if (self._silo[col][0] == player or self._silo[col][1] == player):
+            self._mark_count[player] = self._mark_count.get(player, 0) + 1
+            # Only one marker can top 3 of the 5 columns
+            if (self._mark_count[player] >= 3):
+                self._winner = player
+
+    # Copy of the board, 5 columns of 3 rows from the bottom, holding the markers or None
+    def getBoard(self) -> list:
+        return [list(column) for column in self._silo]
 
     # Compute the available moves from the current silo
     def getAvailableMove(self) -> list:
@@ -35,12 +98,47 @@ class Silo:
                 else:
                     res[i][j] = -1
         return str(res)
+
+    # Integer board code seen from the marker own, in range [0, Silo.STATES)
+    # Column i contributes 15^i * ((2^height - 1) + sum of 2^row for the own rice)
+    def getSiloCode(self, own:str) -> int:
+        return self._occupancy_code + self._marker_code.get(own, 0)
+
+    # Encode a 5x3 board into the integer board code, seen from the marker own
+    @staticmethod
+    def encodeBoard(board:list, own, empty=None) -> int:
+        code = 0
+        for i in range(5):
+            for j in range(3):
+                if (board[i][j] == empty):
+                    continue
+                code += (1 << j) * (2 if board[i][j] == own else 1) * Silo.COLUMN_WEIGHTS[i]
+        return code
+
+    # Decode the integer board code into a 5x3 board, 1 = own, -1 = opponent, 0 = nothing
+    @staticmethod
+    def decodeBoard(code:int) -> list:
+        board = [[0]*3 for _ in range(5)]
+        for i in range(5):
+            code, column = divmod(code, Silo.COLUMN_STATES)
+            height = (column + 1).bit_length() - 1
+            own = column - ((1 << height) - 1)
+            for j in range(height):
+                board[i][j] = 1 if (own >> j) & 1 else -1
+        return board
     
 #Virtual Game board
 class VirtualSilo(Silo):
-    def __init__(self) -> None:
+    # check: compare isEndGame and scoreBoard with a scan of the board on every call
+    # rng: random numbers of the game (see rng.py)
+    # profiler: time spent in refreshBoard and isEndGame (see profiling.py), None when disabled
+    def __init__(self, sink=None, check:bool=False, rng:BlockRandom=None, profiler=None) -> None:
         super(VirtualSilo, self).__init__()
         self.__update_list = []
+        self._sink = sink # observer of the placements, see events.py
+        self._check = check
+        self._rng = rng if rng is not None else BlockRandom()
+        self._profiler = profiler
     
     #When player start the decision to place the rice into the silo, there is a delay action from decision to action
     def place(self, player: str, col: int, next_place_time: float) -> None:
@@ -49,8 +147,24 @@ class VirtualSilo(Silo):
         #delay is the decision to action time
         heapq.heappush(self.__update_list, (next_place_time, player, col))
 
+    #The time of the next pending placement, None if nothing is pending
+    def getNextPlaceTime(self) -> float:
+        if (len(self.__update_list) == 0):
+            return None
+        return self.__update_list[0][0]
+
     #It will try to refresh the board if the task list being update
     def refreshBoard(self, current_time:float) -> None:
+        if (self._profiler is not None):
+            phase_time = self._profiler.start()
+        placed = self.step(current_time)
+        if (placed == True and self._sink is not None):
+            self._sink.onPlace(self, current_time)
+        if (self._profiler is not None):
+            self._profiler.stop('refreshBoard', phase_time)
+
+    #Land the placements due at the current time without any event, return whether a paddy rice landed
+    def step(self, current_time:float) -> bool:
         placed = False
         while (len(self.__update_list) > 0 and current_time >= self.__update_list[0][0]):
             time, player, col = heapq.heappop(self.__update_list)
@@ -59,20 +173,33 @@ class VirtualSilo(Silo):
             if (len(self.__update_list) > 0 and time == self.__update_list[0][0]):
                 time2, player2, col2 = heapq.heappop(self.__update_list)
                 options = [player2, player]
-                idx = np.random.choice(len(options))
+                idx = self._rng.choice(len(options))
                 player = options[idx]
             
             placed = True
-            for i in range(3):
-                if (self._silo[col][i] == None):
-                    self._silo[col][i] = player
-                    break
-        
-        if (placed == True):
-            print("Current Time: {:.1f}".format(current_time))
-            print("=====PLACE======")
-            self.printSilo()
-            print("================")
+            self._putRice(col, player)
+        return placed
+
+    #Pending placements (time, marker, column), the earliest first
+    def getPendingPlacements(self) -> list:
+        return sorted(self.__update_list)
+
+    #Copy of the board and the pending placements for simulations, without sink, check nor profiler
+    def clone(self, rng:BlockRandom=None):
+        silo = VirtualSilo.__new__(VirtualSilo)
+        silo.__dict__.update(self.__dict__)
+        silo._silo = [list(column) for column in self._silo]
+        silo._marker_code = dict(self._marker_code)
+        silo._cell_count = dict(self._cell_count)
+        silo._top_count = dict(self._top_count)
+        silo._mark_count = dict(self._mark_count)
+        silo.__update_list = list(self.__update_list)
+        silo._sink = None
+        silo._check = False
+        silo._profiler = None
+        if (rng is not None):
+            silo._rng = rng
+        return silo
 
     #Print board when update happens
     def printSilo(self) -> None:
@@ -84,9 +211,22 @@ class VirtualSilo(Silo):
                 print('---', end=' ')
             print('')
 
-    #Decide if there is a winner
+    #Decide if there is a winner, read from the aggregates kept by the placements
     def isEndGame(self) -> str:
-        
+        if (self._profiler is not None):
+            phase_time = self._profiler.start()
+        if (self._winner != None):
+            result = self._winner
+        else:
+            result = 'f' if self._filled_tops == 5 else None
+        if (self._check == True and result != self._scanEndGame()):
+            raise RuntimeError("isEndGame aggregate {} does not match the board {}".format(result, self._silo))
+        if (self._profiler is not None):
+            self._profiler.stop('isEndGame', phase_time)
+        return result
+
+    #Decide if there is a winner by scanning the board
+    def _scanEndGame(self) -> str:
         is_full = True
         need_detail_check_team = None
 
@@ -123,8 +263,15 @@ class VirtualSilo(Silo):
                 return need_detail_check_team
         return 'f' if is_full == True else None
     
-    # Get the scoring
+    # Get the scoring, read from the aggregates kept by the placements
     def scoreBoard(self) -> dict:
+        score_baord = {player: 30 * count for player, count in self._cell_count.items()}
+        if (self._check == True and score_baord != self._scanScoreBoard()):
+            raise RuntimeError("scoreBoard aggregate {} does not match the board {}".format(score_baord, self._silo))
+        return score_baord
+
+    # Get the scoring by scanning the board
+    def _scanScoreBoard(self) -> dict:
         score_baord = {}
         for i in range(5):
             for j in range(3):
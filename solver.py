@@ -0,0 +1,117 @@
+import math
+import numpy as np
+from silo import Silo
+from player import Player
+from policy import ACTIONS, DenseQTable
+from tables import COLUMN_HEIGHT, getColumns, getTables
+from vecsilo import getRewards
+
+# Dynamic programming over every (board code, paddy rice alert) state of a profile, instead of self-play
+#
+# The state a player decides on is the board seen from its colour and its paddy rice alert, as in AIPlayer.
+# Between two decisions of the player:
+#   - a column action drops its paddy rice, it lands with the success rate, the alert turns on when enough
+#     paddy rice were dropped; during the cooldown the opponent drops (speed + tick) / (opponent speed + tick)
+#     paddy rice, each landing with the opponent success rate
+#   - stay (-1) waits one tick, the opponent may drop one paddy rice meanwhile
+# A finished board is worth the reward of AIPlayer.getReward. The action values are the ones the Monte Carlo
+# backup of AIPlayer.learn converges to: Q = gamma * (reward or value of the next decision).
+# The game clock, the freeze time and running out of paddy rice are not modelled.
+#
+# Every drop fills one cell, so the values of the boards with k paddy rice only depend on the boards with more
+# paddy rice and on themselves (missed drops and stay). The boards are solved from the full silo down,
+# each level exactly: V = max_a (c_a + d_a * V) is max_a c_a / (1 - d_a) when every d_a < 1.
+
+OPPONENTS = ('random', 'greedy') # opponent drops in a random column / in the column worst for the player
+DECAY_GAMMA = 0.9 # same as AIPlayer
+TICK = 0.1 # same as Robocon2024Game
+# More opponent drops than cells in the silo never matter
+MAX_DROPS = 15
+
+# Probability the alert turns on at a drop, the alert is on once paddy rice <= PADDY_RICE_NUM * success rate
+def alertRate(success_rate:float) -> float:
+    drops = math.ceil(Player.PADDY_RICE_NUM * (1 - success_rate) - 1e-9)
+    return 1 if drops <= 0 else 1 / drops
+
+# Action values of the profile, in the layout of DenseQTable
+def solveProfile(speed:int, success_rate:float, opponent_speed:float=9, opponent_success_rate:float=0.85, opponent:str='random', decay_gamma:float=DECAY_GAMMA, tables=None) -> DenseQTable:
+    if (opponent not in OPPONENTS):
+        raise ValueError("opponent must be one of {}".format(OPPONENTS))
+    tables = getTables() if tables is None else tables
+    gamma = decay_gamma
+    p = success_rate
+    po = opponent_success_rate
+    h = alertRate(success_rate)
+
+    # Opponent drops during a cooldown, mixed between f and f + 1 drops
+    drops = min(max(speed, TICK) / max(opponent_speed, TICK), MAX_DROPS)
+    f = int(drops)
+    w = drops - f
+    depth = max(f + (1 if w > 0 else 0), 1)
+    # Probability the opponent drops during one tick of stay
+    q = min(TICK / max(opponent_speed, TICK), 1)
+
+    codes = np.arange(Silo.STATES)
+    level = COLUMN_HEIGHT[getColumns(codes)].sum(axis=1)
+    terminal = tables.winner != 0
+    reward = getRewards(tables.winner, tables.score[:, 0], tables.score[:, 1], 1).astype(np.float64)
+
+    # after[j][x, alert]: expected value at the next decision when the opponent drops j paddy rice on board x
+    after = np.zeros((depth + 1, Silo.STATES, 2), dtype=np.float32)
+    values = np.zeros((Silo.STATES, 2, ACTIONS), dtype=np.float32)
+
+    order = np.argsort(level, kind='stable')
+    bounds = np.searchsorted(level[order], np.arange(17))
+    for k in range(15, -1, -1):
+        states = order[bounds[k]:bounds[k + 1]]
+        ends = states[terminal[states]]
+        after[:, ends, :] = reward[ends][None, :, None]
+        states = states[~terminal[states]]
+        n = len(states)
+        if (n == 0):
+            continue
+
+        # after[j] = alpha[j] + beta[j] * V on the states of this level
+        opponent_next = tables.next_state[states, 1, :]
+        opponent_mask = opponent_next >= 0
+        opponent_next = np.where(opponent_mask, opponent_next, 0)
+        alpha = np.zeros((depth + 1, n, 2))
+        for j in range(1, depth + 1):
+            landed = after[j - 1][opponent_next]
+            if (opponent == 'random'):
+                landed = (landed * opponent_mask[:, :, None]).sum(axis=1) / opponent_mask.sum(axis=1)[:, None]
+            else:
+                landed = np.where(opponent_mask[:, :, None], landed, np.inf).min(axis=1)
+            alpha[j] = po * landed + (1 - po) * alpha[j - 1]
+        beta = (1 - po) ** np.arange(depth + 1)
+        alpha_m = (1 - w) * alpha[f] + w * alpha[min(f + 1, depth)]
+        beta_m = (1 - w) * beta[f] + w * beta[min(f + 1, depth)]
+
+        own_next = tables.next_state[states, 0, :]
+        own_mask = own_next >= 0
+        own_next = np.where(own_mask, own_next, 0)
+        landed = (1 - w) * after[f][own_next] + w * after[min(f + 1, depth)][own_next]
+
+        c = np.empty((n, 2, ACTIONS))
+        d = np.empty((2, ACTIONS))
+        value = np.empty((n, 2))
+        for alert in (1, 0):
+            c[:, alert, 0] = gamma * q * alpha[1][:, alert]
+            d[alert, 0] = gamma * ((1 - q) + q * (1 - po))
+            if (alert == 1):
+                c[:, 1, 1:] = gamma * (p * landed[:, :, 1] + (1 - p) * alpha_m[:, 1][:, None])
+                d[1, 1:] = gamma * (1 - p) * beta_m
+            else:
+                on = p * landed[:, :, 1] + (1 - p) * (alpha_m[:, 1] + beta_m * value[:, 1])[:, None]
+                c[:, 0, 1:] = gamma * ((1 - h) * (p * landed[:, :, 0] + (1 - p) * alpha_m[:, 0][:, None]) + h * on)
+                d[0, 1:] = gamma * (1 - h) * (1 - p) * beta_m
+            fixed = c[:, alert, :] / (1 - d[alert, :])
+            fixed[:, 1:] = np.where(own_mask, fixed[:, 1:], -np.inf)
+            value[:, alert] = fixed.max(axis=1)
+
+        q_values = c + d[None, :, :] * value[:, :, None]
+        q_values[:, :, 1:] = np.where(own_mask[:, None, :], q_values[:, :, 1:], 0)
+        values[states] = q_values
+        for j in range(depth + 1):
+            after[j][states] = alpha[j] + beta[j] * value
+    return DenseQTable(values.reshape(-1))
@@ -0,0 +1,28 @@
+import subprocess
+import sys
+import time
+
+# Start time of a command line of the program, see the startup sub-command
+# Only the standard library is imported, so that measuring a command loads nothing it would not load itself
+
+# Wall time in seconds of each run of the script command line in a new interpreter, from the launch to the exit
+def measureStartup(command:list, runs:int=10) -> list:
+    times = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        subprocess.run([sys.executable] + command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start_time)
+    return times
+
+# Slowest modules imported directly by the script command line, with the seconds spent importing them and their imports
+def importTimes(command:list, top:int=10) -> list:
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if (not line.startswith('import time:') or '|' not in line):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented under the module importing them
+        if (cumulative.strip().isdigit() and not name[1:].startswith(' ')):
+            imports.append((name.strip(), int(cumulative) / 1e6))
+    return sorted(imports, key=lambda item: -item[1])[:top]
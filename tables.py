@@ -0,0 +1,98 @@
+import os
+import numpy as np
+from silo import Silo
+
+# Lookup tables over every board code (see Silo.getSiloCode), seen from the own colour
+# Colours: 0 = own, 1 = opponent. Winner: 0 = no one, 1 = own, 2 = opponent, 3 = full silo (same as vecsilo)
+# Version 2 is compressed, the files of version 1 are rebuilt and written again
+TABLES_VERSION = 2
+DEFAULT_PATH = os.path.join('models', 'silo_tables.npz')
+
+COLUMN_CODES = np.arange(Silo.COLUMN_STATES)
+COLUMN_HEIGHT = np.array([(c + 1).bit_length() - 1 for c in range(Silo.COLUMN_STATES)])
+# Bit j set when the paddy rice of row j is own
+COLUMN_BITS = COLUMN_CODES - ((1 << COLUMN_HEIGHT) - 1)
+COLUMN_OWN = np.array([bin(b).count('1') for b in COLUMN_BITS])
+COLUMN_OPPONENT = COLUMN_HEIGHT - COLUMN_OWN
+# A Mark is a column topped by a colour with the same colour underneath
+COLUMN_OWN_MARK = (COLUMN_HEIGHT == 3) & ((COLUMN_BITS & 4) != 0) & ((COLUMN_BITS & 3) != 0)
+COLUMN_OPPONENT_MARK = (COLUMN_HEIGHT == 3) & ((COLUMN_BITS & 4) == 0) & ((COLUMN_BITS & 3) != 3)
+COLUMN_SWAP = ((1 << COLUMN_HEIGHT) - 1) + (~COLUMN_BITS & ((1 << COLUMN_HEIGHT) - 1))
+# Column code after dropping a colour, -1 when the column is full
+COLUMN_NEXT = np.stack([np.where(COLUMN_HEIGHT < 3, (1 << (COLUMN_HEIGHT + 1)) - 1 + COLUMN_BITS + (1 << COLUMN_HEIGHT) * own, -1) for own in (1, 0)], axis=1)
+
+WEIGHTS = np.array(Silo.COLUMN_WEIGHTS, dtype=np.int64)
+
+# (codes, 5) column codes of the board codes
+def getColumns(codes:np.ndarray) -> np.ndarray:
+    return (np.asarray(codes, dtype=np.int64)[:, None] // WEIGHTS) % Silo.COLUMN_STATES
+
+class SiloTables:
+    def __init__(self, arrays:dict) -> None:
+        # (STATES, 2, 5) board code after dropping the colour in the column, -1 when it is full
+        self.next_state = arrays['next_state']
+        # (STATES,) bitmask of the columns that are not full
+        self.available = arrays['available']
+        # (STATES,) end game result
+        self.winner = arrays['winner']
+        # (STATES, 2) score of the own and the opponent colour
+        self.score = arrays['score']
+        # (STATES,) board code seen from the opponent colour
+        self.swap = arrays['swap']
+        # Available columns of each bitmask, as Silo.getAvailableMove
+        self.moves = [[i for i in range(5) if (mask >> i) & 1] for mask in range(32)]
+
+    # Enumerate every board code
+    @staticmethod
+    def build():
+        codes = np.arange(Silo.STATES, dtype=np.int64)
+        columns = getColumns(codes)
+        full = COLUMN_HEIGHT[columns] == 3
+
+        next_state = np.empty((Silo.STATES, 2, 5), dtype=np.int32)
+        for colour in range(2):
+            after = COLUMN_NEXT[columns, colour]
+            next_state[:, colour, :] = np.where(after >= 0, codes[:, None] + (after - columns) * WEIGHTS, -1)
+
+        winner = np.where(full.all(axis=1), 3, 0)
+        winner = np.where(COLUMN_OWN_MARK[columns].sum(axis=1) >= 3, 1, winner)
+        winner = np.where(COLUMN_OPPONENT_MARK[columns].sum(axis=1) >= 3, 2, winner)
+        return SiloTables({
+            'next_state': next_state,
+            'available': ((~full) << np.arange(5)).sum(axis=1).astype(np.uint8),
+            'winner': winner.astype(np.int8),
+            'score': (np.stack([COLUMN_OWN[columns].sum(axis=1), COLUMN_OPPONENT[columns].sum(axis=1)], axis=1) * 30).astype(np.int16),
+            'swap': (COLUMN_SWAP[columns] @ WEIGHTS).astype(np.int32),
+        })
+
+    # Compressed, about 9 MB instead of 38 MB in the models directory, read back in a fraction of the build time
+    def save(self, path:str) -> None:
+        directory = os.path.dirname(path)
+        if (directory != '' and not os.path.exists(directory)):
+            os.mkdir(directory)
+        temp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temp_path, 'wb') as fw:
+            np.savez_compressed(fw, version=TABLES_VERSION, next_state=self.next_state, available=self.available, winner=self.winner, score=self.score, swap=self.swap)
+        os.replace(temp_path, path)
+
+    # Read the tables saved at the path, None if they are missing or from another version
+    @staticmethod
+    def load(path:str):
+        if (not os.path.exists(path)):
+            return None
+        with np.load(path) as arrays:
+            if (int(arrays['version']) != TABLES_VERSION):
+                return None
+            return SiloTables({name: arrays[name] for name in arrays.files})
+
+_cache = {}
+
+# The tables of the process, read from the cache file or built and cached on first use
+def getTables(path:str=DEFAULT_PATH) -> SiloTables:
+    if (path not in _cache):
+        tables = SiloTables.load(path)
+        if (tables is None):
+            tables = SiloTables.build()
+            tables.save(path)
+        _cache[path] = tables
+    return _cache[path]
@@ -0,0 +1,136 @@
+import csv
+import json
+import os
+import time
+from collections import deque
+from tqdm import tqdm
+
+# Figures of a training run emitted every few episodes to a CSV or JSON lines file and the console,
+# to follow the convergence and the throughput while it runs
+# The rates are kept for each player and profile: in self-play both players learn the same profile and their rates
+# of that profile mirror each other
+# CSV files get one row per profile, player and emission, JSON lines files one object per emission with the profiles
+# and their players nested
+FIELDS = ('episode', 'elapsed', 'episodes_per_second', 'rss_mb', 'mean_abs_update', 'new_states', 'profile', 'entries', 'player', 'games', 'win_rate', 'draw_rate', 'loss_rate')
+
+# Resident memory of the process in MB, the peak when the current one is not known, None when neither is
+def getRSS() -> float:
+    try:
+        with open('/proc/self/statm') as fr:
+            return int(fr.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # KB on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if os.uname().sysname == 'Darwin' else peak / 2**10
+    except ImportError:
+        return None
+
+class Telemetry:
+    # path: .csv or .jsonl file the figures are appended to, None for the console only
+    # every: episodes between two emissions, window: games of each player and profile the rates are computed on
+    def __init__(self, path:str=None, every:int=1000, window:int=1000, console:bool=True) -> None:
+        if (every < 1 or window < 1):
+            raise ValueError("every and window must be at least 1")
+        self.path = path
+        self.every = every
+        self.window = window
+        self.console = console
+        self.__file = None
+        self.__writer = None
+        if (path is not None):
+            self.__file = open(path, 'a', newline='')
+            if (not path.endswith('.jsonl')):
+                self.__writer = csv.DictWriter(self.__file, fieldnames=FIELDS)
+                if (self.__file.tell() == 0):
+                    self.__writer.writeheader()
+        # Results of the last games of each (player, profile): 1 win, 0 draw, -1 loss
+        self.__results = {}
+        self.__start_time = time.time()
+        self.__last_time = self.__start_time
+        self.last_episode = 0
+        self.__change = 0
+        self.__states = 0
+        self.__new_states = 0
+
+    # Record what one player (its marker) learnt from an episode
+    def record(self, player:str, profile:str, reward:int, states:int, change:float, new_states:int) -> None:
+        if ((player, profile) not in self.__results):
+            self.__results[(player, profile)] = deque(maxlen=self.window)
+        self.__results[(player, profile)].append(1 if reward > 1 else 0 if reward == 1 else -1)
+        self.__change += change
+        self.__states += states
+        self.__new_states += new_states
+
+    def due(self, episode:int) -> bool:
+        return episode - self.last_episode >= self.every
+
+    # Emit the figures since the last emission, entries: entries of the Q-table of each profile
+    def emit(self, episode:int, entries:dict) -> dict:
+        now = time.time()
+        figures = {
+            'episode': episode,
+            'elapsed': round(now - self.__start_time, 3),
+            'episodes_per_second': (episode - self.last_episode) / (now - self.__last_time) if now > self.__last_time else None,
+            'rss_mb': getRSS(),
+            'mean_abs_update': self.__change / self.__states if self.__states > 0 else None,
+            'new_states': self.__new_states,
+            'profiles': {},
+        }
+        for profile in sorted(set(profile for _, profile in self.__results) | set(entries)):
+            figures['profiles'][profile] = {'entries': entries.get(profile), 'players': {}}
+        for (player, profile), results in sorted(self.__results.items()):
+            games = len(results)
+            figures['profiles'][profile]['players'][player] = {
+                'games': games,
+                'win_rate': sum(1 for result in results if result == 1) / games,
+                'draw_rate': sum(1 for result in results if result == 0) / games,
+                'loss_rate': sum(1 for result in results if result == -1) / games,
+            }
+        self.__write(figures)
+        if (self.console == True):
+            tqdm.write(Telemetry.summary(figures))
+        self.__last_time = now
+        self.last_episode = episode
+        self.__change = 0
+        self.__states = 0
+        self.__new_states = 0
+        return figures
+
+    def __write(self, figures:dict) -> None:
+        if (self.__file is None):
+            return
+        if (self.__writer is None):
+            self.__file.write(json.dumps(figures) + '\n')
+        else:
+            row = {key: value for key, value in figures.items() if key != 'profiles'}
+            for profile, values in figures['profiles'].items():
+                if (len(values['players']) == 0):
+                    self.__writer.writerow(dict(row, profile=profile, entries=values['entries']))
+                for player, rates in values['players'].items():
+                    self.__writer.writerow(dict(row, profile=profile, entries=values['entries'], player=player, **rates))
+        self.__file.flush()
+
+    # One console line: the throughput, the learning and the rates of each player over the games of every profile
+    @staticmethod
+    def summary(figures:dict) -> str:
+        players = {}
+        for values in figures['profiles'].values():
+            for player, rates in values['players'].items():
+                players.setdefault(player, []).append(rates)
+        line = "Episode {}: {} episodes/s, RSS {} MB, mean |dQ| {}, {} new states, {} profiles".format(
+            figures['episode'],
+            '-' if figures['episodes_per_second'] is None else '{:.0f}'.format(figures['episodes_per_second']),
+            '-' if figures['rss_mb'] is None else '{:.0f}'.format(figures['rss_mb']),
+            '-' if figures['mean_abs_update'] is None else '{:.4f}'.format(figures['mean_abs_update']),
+            figures['new_states'], len(figures['profiles']))
+        for player, profiles in sorted(players.items()):
+            games = sum(rates['games'] for rates in profiles)
+            line += ", {} rolling W/D/L {:.2f}/{:.2f}/{:.2f}".format(player, *[sum(rates[rate] * rates['games'] for rates in profiles) / games for rate in ('win_rate', 'draw_rate', 'loss_rate')])
+        return line
+
+    def close(self) -> None:
+        if (self.__file is not None):
+            self.__file.close()
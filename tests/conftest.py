@@ -0,0 +1,33 @@
+import os
+import sys
+import pytest
+
+# The modules of the game are at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from events import EventSink
+
+# Every test runs in its own directory, the models and the cached silo tables are written there
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+# Sink recording the decisions, the boards after every placement and the end of the games
+class RecordingSink(EventSink):
+    def __init__(self) -> None:
+        self.events = []
+        self.silo = None
+
+    def onGameStart(self, silo) -> None:
+        self.silo = silo
+        self.events.append(('start', ))
+
+    def onPlace(self, silo, t:float) -> None:
+        self.events.append(('place', t, tuple(tuple(column) for column in silo.getBoard())))
+
+    def onDecision(self, player, t:float, available_actions:list, action:int) -> None:
+        self.events.append(('decision', player.name, t, tuple(available_actions), action))
+
+    def onEndGame(self, silo, winner:str, score:dict) -> None:
+        self.events.append(('end', winner, tuple(sorted(score.items()))))
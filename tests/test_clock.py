@@ -0,0 +1,33 @@
+import pytest
+from conftest import RecordingSink
+from player import AIPlayer, GreedyPlayer, RandomPlayer
+from rng import BlockRandom
+from robocon2024 import Robocon2024Game
+
+# Events of the games played with the clock, the players get a new profile every game
+def playGames(clock:str, make_players, seed:int, games:int=20) -> list:
+    rng = BlockRandom(seed)
+    players = make_players(rng)
+    sink = RecordingSink()
+    game = Robocon2024Game(players, clock=clock, sink=sink, rng=rng)
+    for _ in range(games):
+        game.start()
+        for player in players:
+            player.reset()
+    return sink.events
+
+PLAYERS = {
+    'random': lambda rng: [RandomPlayer('Red', 'r', rng=rng), RandomPlayer('Blue', 'b', rng=rng)],
+    'greedy': lambda rng: [GreedyPlayer('Red', 'r', rng=rng), RandomPlayer('Blue', 'b', rng=rng)],
+    # Exploring AI players with empty tables, both with the same profile
+    'ai': lambda rng: [AIPlayer('Red', 'r', 0.5, speed=3, freeze_time=10, success_rate=0.8, rng=rng), AIPlayer('Blue', 'b', 0.5, speed=3, freeze_time=10, success_rate=0.8, rng=rng)],
+}
+
+# The event clock only skips the ticks where nothing happens: same decisions at the same times, same games
+@pytest.mark.parametrize('players', sorted(PLAYERS))
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def testEventClockMatchesTickClock(players, seed):
+    tick = playGames('tick', PLAYERS[players], seed)
+    event = playGames('event', PLAYERS[players], seed)
+    assert sum(1 for event_ in tick if event_[0] == 'decision') > 0
+    assert event == tick
@@ -0,0 +1,58 @@
+import os
+import numpy as np
+import pytest
+from conftest import RecordingSink
+from frozen import exportPolicy, getPolicyPath, loadPolicy
+from player import AIPlayer, FrozenAIPlayer, RandomPlayer
+from policy import KEYS, DenseQTable, getProfile, saveTable
+from rng import BlockRandom
+from robocon2024 import Robocon2024Game
+
+SPEED = 2
+SUCCESS_RATE = 0.8
+PROFILE = getProfile(SPEED, SUCCESS_RATE)
+
+# Sink checking every decision of the player against the exported actions of the board it was taken on
+class PolicySink(RecordingSink):
+    def __init__(self, player_name:str, actions:np.ndarray) -> None:
+        super(PolicySink, self).__init__()
+        self.player_name = player_name
+        self.actions = actions
+        self.checked = 0
+
+    def onDecision(self, player, t:float, available_actions:list, action:int) -> None:
+        if (player.name == self.player_name):
+            assert action == self.actions[(self.silo.getSiloCode(player.marker) << 1) + player.paddy_rice_alert]
+            self.checked += 1
+
+# Export a table with few distinct values, so that the greedy choices often break ties, and return its actions
+def exportTable(seed:int, symmetric:bool) -> np.ndarray:
+    os.makedirs('models', exist_ok=True)
+    saveTable('models', PROFILE, DenseQTable(np.random.default_rng(seed).integers(-2, 3, size=KEYS).astype(np.float32)))
+    exportPolicy('models', PROFILE, 'policies', symmetric=symmetric)
+    return loadPolicy(getPolicyPath('policies', PROFILE), PROFILE)
+
+def playGames(players:list, sink, seed:int, games:int=30) -> None:
+    game = Robocon2024Game(players, sink=sink, rng=BlockRandom(seed))
+    for _ in range(games):
+        game.start()
+        for player in players:
+            player.reset()
+
+# AIPlayer chooses the action compiled by export on every move, with and without --symmetric
+@pytest.mark.parametrize('symmetric', [False, True])
+@pytest.mark.parametrize('seed', [0, 1])
+def testExportedPolicyMatchesAIPlayer(symmetric, seed):
+    actions = exportTable(seed, symmetric)
+    players = [AIPlayer('AI', 'r', 0, speed=SPEED, freeze_time=0, success_rate=SUCCESS_RATE, backend='dense', symmetric=symmetric), RandomPlayer('Random', 'b')]
+    sink = PolicySink('AI', actions)
+    playGames(players, sink, seed)
+    assert sink.checked > 0
+
+# FrozenAIPlayer plays the exported actions
+def testFrozenAIPlayerPlaysExportedPolicy():
+    actions = exportTable(0, False)
+    players = [FrozenAIPlayer('Frozen', 'r', directory='policies', speed=SPEED, freeze_time=0, success_rate=SUCCESS_RATE), RandomPlayer('Random', 'b')]
+    sink = PolicySink('Frozen', actions)
+    playGames(players, sink, 0)
+    assert sink.checked > 0
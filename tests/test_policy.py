@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from policy import BoundedQTable, DenseQTable, SparseQTable
+
+TABLES = {
+    'dense': DenseQTable,
+    'sparse': SparseQTable,
+    'bounded': lambda: BoundedQTable(max_entries=20),
+}
+
+# Learn the episodes into the table, return the keys learnt in the order they were last learnt as the parallel training does
+def learnEpisodes(table, episodes:list) -> dict:
+    keys = {}
+    for states, reward in episodes:
+        table.learn(states, reward, 0.2, 0.9)
+        for state in reversed(states):
+            keys.pop(state, None)
+            keys[state] = None
+    return keys
+
+# A copy brought up to date with the changes holds the same keys and values as the learnt table,
+# in the same order for the bounded tables which drop their first keys
+@pytest.mark.parametrize('backend', TABLES)
+def testCopyUpToDate(backend):
+    rng = np.random.default_rng(5)
+    table = TABLES[backend]()
+    # The tables of the workers are bounded as well, see PolicyStore
+    copy = BoundedQTable(table, table.max_entries) if backend == 'bounded' else table.copy()
+    for _ in range(4):
+        episodes = [(rng.integers(1, 40, size=rng.integers(1, 8)).tolist(), float(rng.choice([-10, 10]))) for _ in range(5)]
+        copy.assign(*table.changes(learnEpisodes(table, episodes)))
+        if (backend == 'dense'):
+            assert np.array_equal(copy.values, table.values)
+        elif (backend == 'bounded'):
+            assert list(copy.items()) == list(table.items())
+        else:
+            assert copy == table
@@ -0,0 +1,31 @@
+import os
+import pytest
+from replay import EpisodeLog, readLog, replayLog
+
+def appendEpisodes(path:str, episodes:list) -> None:
+    log = EpisodeLog(path)
+    for states in episodes:
+        log.append('S5_R0.8', states, 'r', {'r': 60, 'b': 30}, 'r', 10)
+    log.close()
+
+# A record cut by a crash is dropped when the log is opened again, the records appended after it read back whole
+@pytest.mark.parametrize('cut', [1, 6, 12])
+def testAppendAfterCutRecord(cut):
+    appendEpisodes('episodes.log', [[1, 2, 3], [4, 5, 6]])
+    os.truncate('episodes.log', os.path.getsize('episodes.log') - cut)
+    appendEpisodes('episodes.log', [[7, 8], [9]])
+    assert [record[5].tolist() for record in readLog('episodes.log')] == [[1, 2, 3], [7, 8], [9]]
+    assert [record[1:5] for record in readLog('episodes.log')] == [(10, 60, 30, 1)] * 3
+
+def testAppendToOtherFile():
+    with open('episodes.log', 'wb') as fw:
+        fw.write(b'not a log')
+    with pytest.raises(ValueError):
+        EpisodeLog('episodes.log')
+
+# The episodes are learnt from empty tables, never a second time into trained models
+def testReplayIntoEmptyDirectory():
+    appendEpisodes('episodes.log', [[1, 2, 3], [4, 5, 6]])
+    assert replayLog('episodes.log', 'models_replay') == 2
+    with pytest.raises(ValueError):
+        replayLog('episodes.log', 'models_replay')
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from player import GreedyPlayer, RandomPlayer
+from rng import BlockRandom
+from robocon2024 import Robocon2024Game
+from silo import Silo, VirtualSilo
+
+MARKERS = {1: 'r', -1: 'b', 0: None}
+
+def assertAggregates(silo:VirtualSilo) -> None:
+    assert silo.isEndGame() == silo._scanEndGame()
+    assert silo.scoreBoard() == silo._scanScoreBoard()
+    assert silo.getSiloCode('r') == Silo.encodeBoard(silo.getBoard(), 'r')
+    assert silo.getSiloCode('b') == Silo.encodeBoard(silo.getBoard(), 'b')
+
+# The aggregates rebuilt by updateBoard read the same as a scan of the board
+def testAggregatesOfBoards():
+    rng = np.random.default_rng(0)
+    silo = VirtualSilo()
+    for code in rng.integers(0, Silo.STATES, size=20000).tolist():
+        silo.updateBoard([[MARKERS[cell] for cell in column] for column in Silo.decodeBoard(code)])
+        assertAggregates(silo)
+
+# The aggregates kept up to date by every placement read the same as a scan of the board
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def testAggregatesOfPlacements(seed):
+    rng = BlockRandom(seed)
+    for _ in range(500):
+        silo = VirtualSilo(rng=rng)
+        t = 0
+        while len(silo.getAvailableMove()) > 0 and silo.isEndGame() is None:
+            available = silo.getAvailableMove()
+            silo.place('r' if rng.random() < 0.5 else 'b', col=available[rng.choice(len(available))], next_place_time=t)
+            silo.refreshBoard(current_time=t)
+            assertAggregates(silo)
+            t += 1
+
+# Robocon2024Game(check=True) compares the aggregates with the scans on every call and raises on a difference
+@pytest.mark.parametrize('seed', [0, 1])
+def testGamesWithCheck(seed):
+    rng = BlockRandom(seed)
+    players = [GreedyPlayer('Red', 'r', rng=rng), RandomPlayer('Blue', 'b', rng=rng)]
+    game = Robocon2024Game(players, check=True, rng=rng)
+    for _ in range(50):
+        game.start()
+        for player in players:
+            player.reset()
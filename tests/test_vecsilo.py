@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+from policy import KEYS
+from rng import BlockRandom, spawnGenerators
+from silo import VirtualSilo
+from tables import SiloTables
+from vecsilo import TICK_TIMES, FULL, NO_WINNER, TableVecVirtualSilo, VecPlayer, VecRobocon2024Game, VecVirtualSilo, greedyPolicy
+
+@pytest.fixture(scope='module')
+def tables():
+    return SiloTables.build()
+
+# Results, scores and decision keys of n games, on the int8 boards or on the lookup tables
+# Every player and the silo draw from their own stream, so both environments get the same numbers
+def playGames(seed:int, tables=None, values:np.ndarray=None, n:int=256) -> tuple:
+    streams = spawnGenerators(seed, 3)
+    policy = greedyPolicy(lambda keys: values[keys]) if values is not None else None
+    players = [VecPlayer(n, team, policy=policy, random_rate=0.3 if values is not None else 0, record=True, rng=streams[team]) for team in (1, 2)]
+    game = VecRobocon2024Game(players, rng=streams[0], tables=tables)
+    winner, score = game.start()
+    return winner, score, [player.getTraces() for player in players]
+
+# TableVecVirtualSilo plays on board codes only, with the same games as the int8 boards of VecVirtualSilo
+@pytest.mark.parametrize('seed', [0, 1, 2])
+@pytest.mark.parametrize('greedy', [False, True])
+def testTableEnvironmentMatchesBoards(tables, seed, greedy):
+    # Few distinct values, so that the greedy choices often break ties
+    values = np.random.default_rng(seed).integers(-2, 3, size=KEYS, dtype=np.int8) if greedy == True else None
+    winner, score, traces = playGames(seed, values=values)
+    table_winner, table_score, table_traces = playGames(seed, tables=tables, values=values)
+    assert np.array_equal(table_winner, winner)
+    assert np.array_equal(table_score, score)
+    assert table_traces == traces
+
+RESULTS = {None: NO_WINNER, 'r': 1, 'b': 2, 'f': FULL}
+
+# The same seeded drops in a batch silo and in one VirtualSilo per game, a third of the drops of both teams
+# land at the same time in the same column. Return the batch silo, the VirtualSilos and the games where two drops conflicted
+def dropRice(batch, seed:int, rounds:int=12) -> tuple:
+    rng = np.random.default_rng(seed)
+    n = batch.n
+    silos = [VirtualSilo(rng=BlockRandom(seed)) for _ in range(n)]
+    conflict = np.zeros(n, dtype=bool)
+    active = np.ones(n, dtype=bool)
+    tick = 0
+    for _ in range(rounds):
+        ticks = tick + rng.integers(1, 4, size=(n, 2))
+        drop = rng.random((n, 2)) < 0.8
+        cols = rng.integers(0, 5, size=(n, 2))
+        # Drops landing at the same time go in the same column, the boards then only differ by the colour of the cell
+        cols[:, 1] = np.where(ticks[:, 0] == ticks[:, 1], cols[:, 0], cols[:, 1])
+        conflict |= drop[:, 0] & drop[:, 1] & (ticks[:, 0] == ticks[:, 1])
+        for team, marker in ((1, 'r'), (2, 'b')):
+            games = np.flatnonzero(drop[:, team - 1])
+            batch.place(team, games, cols[games, team - 1].astype(np.int8), TICK_TIMES[ticks[games, team - 1]])
+            for game in games.tolist():
+                silos[game].place(marker, col=int(cols[game, team - 1]), next_place_time=TICK_TIMES[ticks[game, team - 1]])
+        for t in range(tick + 1, tick + 4):
+            batch.refreshBoard(t, active)
+            for silo in silos:
+                silo.refreshBoard(current_time=TICK_TIMES[t])
+        tick += 3
+    return batch, silos, conflict
+
+# The batch silos follow the rules of VirtualSilo: the same boards, and when both teams drop at the same time
+# only one of the two paddy rice lands (which one is drawn from different streams, so only the filled cells are compared)
+@pytest.mark.parametrize('table', [False, True])
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def testBatchSiloMatchesVirtualSilo(tables, table, seed):
+    n = 200
+    batch = TableVecVirtualSilo(n, rng=np.random.default_rng(seed), tables=tables) if table == True else VecVirtualSilo(n, rng=np.random.default_rng(seed))
+    batch, silos, conflict = dropRice(batch, seed)
+    assert conflict.any() and not conflict.all()
+    score = batch.scoreBoard()
+    winner = batch.isEndGame()
+    codes = batch.getSiloCode(1)
+    for game, silo in enumerate(silos):
+        expected = silo.scoreBoard()
+        assert score[game].sum() == sum(expected.values())
+        assert np.array_equal(batch.getAvailableMove()[game], [i in silo.getAvailableMove() for i in range(5)])
+        if (conflict[game] == False):
+            assert score[game].tolist() == [expected.get('r', 0), expected.get('b', 0)]
+            assert winner[game] == RESULTS[silo.isEndGame()]
+            assert codes[game] == silo.getSiloCode('r')
@@ -0,0 +1,302 @@
+import numpy as np
+from silo import Silo
+from player import Player
+from policy import ACTIONS, actionKeys, greedyActions
+from tables import getTables
+
+# The batch environment counts time in ticks of the Robocon2024Game clock
+# TICK_TIMES[k] is the game time at tick k, accumulated the same way as the game loop
+def _tickTimes(game_time:float=180, tick:float=0.1) -> np.ndarray:
+    times = []
+    current_time = 0
+    while current_time < game_time:
+        times.append(current_time)
+        current_time += tick
+    times.append(current_time)
+    return np.array(times)
+
+TICK_TIMES = _tickTimes()
+GAMETICKS = len(TICK_TIMES) - 1
+NO_TIME = len(TICK_TIMES)
+
+# First tick at or after each time
+def toTicks(times:np.ndarray) -> np.ndarray:
+    return np.searchsorted(TICK_TIMES, times, side='left')
+
+# Results of VecVirtualSilo.isEndGame, Silo markers are replaced by the team number
+NO_WINNER = 0
+FULL = 3
+
+ROW_BITS = np.array([1, 2, 4], dtype=np.int64)
+COLUMN_WEIGHTS = np.array(Silo.COLUMN_WEIGHTS, dtype=np.int64)
+COLUMNS = np.arange(5, dtype=np.uint8)
+
+# Rewards of AIPlayer.getReward for the results (winner as VecVirtualSilo.isEndGame) and the scores of the team and its opponent
+def getRewards(winner:np.ndarray, own:np.ndarray, other:np.ndarray, team:int) -> np.ndarray:
+    reward = np.where(own > other, 2, np.where(own < other, -2, 1))
+    reward = np.where((winner == NO_WINNER) | (winner == FULL), reward, np.where(winner == team, 10, -10))
+    return np.where(own == 0, -999, reward)
+
+#N virtual silos played in lockstep, team 1 and team 2 replace the markers
+class VecVirtualSilo:
+    def __init__(self, n:int, rng:np.random.Generator=None) -> None:
+        self.n = n
+        self._rng = rng if rng is not None else np.random.default_rng()
+        self._silo = np.zeros((n, 5, 3), dtype=np.int8)
+        self._heights = np.zeros((n, 5), dtype=np.int8)
+        # Every player has at most one paddy rice on the way: the landing time, its tick and the column
+        self._pending_time = np.full((n, 2), np.inf)
+        self._pending_tick = np.full((n, 2), NO_TIME, dtype=np.int64)
+        self._pending_col = np.zeros((n, 2), dtype=np.int8)
+        self._games = np.arange(n)
+
+    def reset(self) -> None:
+        self._silo[:] = 0
+        self._heights[:] = 0
+        self._pending_time[:] = np.inf
+        self._pending_tick[:] = NO_TIME
+
+    # (games, 5) mask of the columns that are not full, for all games when None
+    def getAvailableMove(self, games:np.ndarray=None) -> np.ndarray:
+        return (self._heights if games is None else self._heights[games]) < 3
+
+    # Board codes of the games (all of them when None) seen from the team, same encoding as Silo.getSiloCode
+    def getSiloCode(self, team:int, games:np.ndarray=None) -> np.ndarray:
+        silo = self._silo if games is None else self._silo[games]
+        heights = self._heights if games is None else self._heights[games]
+        column = (1 << heights.astype(np.int64)) - 1 + (silo == team) @ ROW_BITS
+        return column @ COLUMN_WEIGHTS
+
+    # Paddy rice of the team thrown in the games, landing at the time
+    def place(self, team:int, games:np.ndarray, cols:np.ndarray, land_time:np.ndarray) -> None:
+        self._pending_time[games, team - 1] = land_time
+        self._pending_tick[games, team - 1] = toTicks(land_time)
+        self._pending_col[games, team - 1] = cols
+
+    def _putRice(self, games:np.ndarray, team:int) -> None:
+        cols = self._pending_col[games, team - 1]
+        rows = self._heights[games, cols]
+        free = rows < 3
+        games, cols, rows = games[free], cols[free], rows[free]
+        self._silo[games, cols, rows] = team
+        self._heights[games, cols] += 1
+
+    # Land the paddy rice due at the tick in the active games
+    def refreshBoard(self, t:int, active:np.ndarray) -> None:
+        due = (self._pending_tick <= t) & active[:, None]
+        if (not due.any()):
+            return
+        # Every paddy rice due leaves the pending ones, the one losing a conflict is thrown away as in VirtualSilo.step
+        landed = due.copy()
+        both = due[:, 0] & due[:, 1]
+        red_first = self._pending_time[:, 0] < self._pending_time[:, 1]
+        blue_first = self._pending_time[:, 0] > self._pending_time[:, 1]
+
+        # Case if two player place at the same time, random either one successfully place inside
+        conflict = both & ~red_first & ~blue_first
+        if (conflict.any()):
+            lost = self._games[conflict][self._rng.random(int(conflict.sum())) < 0.5]
+            red_lost = np.zeros(self.n, dtype=bool)
+            red_lost[lost] = True
+            due[conflict & red_lost, 0] = False
+            due[conflict & ~red_lost, 1] = False
+
+        # The earlier paddy rice lands first when both are due
+        early_blue = due[:, 1] & due[:, 0] & blue_first
+        self._putRice(self._games[early_blue], 2)
+        self._putRice(self._games[due[:, 0]], 1)
+        self._putRice(self._games[due[:, 1] & ~early_blue], 2)
+        self._pending_time[landed] = np.inf
+        self._pending_tick[landed] = NO_TIME
+
+    # (n,) earliest pending landing tick of every game
+    def getNextPlaceTime(self) -> np.ndarray:
+        return self._pending_tick.min(axis=1)
+
+    # (n,) NO_WINNER, the winning team or FULL, same rules as VirtualSilo.isEndGame
+    def isEndGame(self) -> np.ndarray:
+        top = self._silo[:, :, 2]
+        result = np.where((top != 0).all(axis=1), FULL, NO_WINNER).astype(np.int8)
+        for team in (1, 2):
+            under = (self._silo[:, :, 0] == team) | (self._silo[:, :, 1] == team)
+            result[((top == team) & under).sum(axis=1) >= 3] = team
+        return result
+
+    # (n, 2) score of the two teams
+    def scoreBoard(self) -> np.ndarray:
+        return np.stack([(self._silo == team).sum(axis=(1, 2)) * 30 for team in (1, 2)], axis=1)
+
+#VecVirtualSilo running on the lookup tables of tables.py, every game is only its board code
+class TableVecVirtualSilo(VecVirtualSilo):
+    def __init__(self, n:int, rng:np.random.Generator=None, tables=None) -> None:
+        super(TableVecVirtualSilo, self).__init__(n, rng=rng)
+        self._tables = tables if tables is not None else getTables()
+        # Board codes seen from team 1
+        self._code = np.zeros(n, dtype=np.int64)
+
+    def reset(self) -> None:
+        super(TableVecVirtualSilo, self).reset()
+        self._code[:] = 0
+
+    def getAvailableMove(self, games:np.ndarray=None) -> np.ndarray:
+        code = self._code if games is None else self._code[games]
+        return ((self._tables.available[code][:, None] >> COLUMNS) & 1).astype(bool)
+
+    def getSiloCode(self, team:int, games:np.ndarray=None) -> np.ndarray:
+        code = self._code if games is None else self._code[games]
+        return code if team == 1 else self._tables.swap[code].astype(np.int64)
+
+    def _putRice(self, games:np.ndarray, team:int) -> None:
+        after = self._tables.next_state[self._code[games], team - 1, self._pending_col[games, team - 1]]
+        free = after >= 0
+        self._code[games[free]] = after[free]
+
+    def isEndGame(self) -> np.ndarray:
+        return self._tables.winner[self._code]
+
+    def scoreBoard(self) -> np.ndarray:
+        return self._tables.score[self._code].astype(np.int64)
+
+# Random choice among the available actions
+def randomPolicy(rng:np.random.Generator):
+    def policy(codes:np.ndarray, alerts:np.ndarray, available:np.ndarray) -> np.ndarray:
+        scores = rng.random(available.shape)
+        scores[~available] = -1
+        return scores.argmax(axis=1) - 1
+    return policy
+
+# Greedy choice from an AIPlayer table, values(keys) gives the values of an array of keys (e.g. table.lookup)
+def greedyPolicy(values):
+    def policy(codes:np.ndarray, alerts:np.ndarray, available:np.ndarray) -> np.ndarray:
+        return greedyActions(values(actionKeys(codes, alerts)), available)
+    return policy
+
+#N copies of a player, with the same rules as Player and AIPlayer.getMove
+class VecPlayer:
+    def __init__(self, n:int, team:int, policy=None, random_rate:float=0, speed:int=None, freeze_time:int=None, success_rate:float=None, record:bool=False, rng:np.random.Generator=None) -> None:
+        if (team not in (1, 2)):
+            raise ValueError("team must be either 1 or 2")
+        self.n = n
+        self.team = team
+        self._rng = rng if rng is not None else np.random.default_rng()
+        self._policy = policy if policy is not None else randomPolicy(self._rng)
+        self._random_rate = random_rate
+        self.__original_speed = speed
+        self.__original_freeze_time = freeze_time
+        self.__original_success_rate = success_rate
+        self.__record = record
+        self.reset()
+
+    def reset(self) -> None:
+        n = self.n
+        # Same ranges as Player, a new profile for every game when not given
+        if (self.__original_speed is None):
+            self.speed = self._rng.integers(0, 18, size=n, endpoint=True)
+        else:
+            self.speed = np.full(n, min(max(self.__original_speed, 0), 18))
+        if (self.__original_freeze_time is None):
+            self.freeze_time = self._rng.integers(0, 170, size=n, endpoint=True)
+        else:
+            self.freeze_time = np.full(n, min(max(self.__original_freeze_time, 0), 170))
+        if (self.__original_success_rate is None):
+            self.success_rate = self._rng.choice([0.7, 0.8, 0.9, 1.0], size=n)
+        else:
+            self.success_rate = np.full(n, min(max(self.__original_success_rate, 0.7), 1.0))
+
+        self._paddy_rice = np.full(n, Player.PADDY_RICE_NUM, dtype=np.int32)
+        self._next_place_time = np.zeros(n)
+        # The same times in ticks
+        self._freeze_tick = toTicks(self.freeze_time)
+        self._next_place_tick = np.zeros(n, dtype=np.int64)
+        self._trace_games = []
+        self._trace_keys = []
+
+    @property
+    def paddy_rice_alert(self) -> np.ndarray:
+        return self._paddy_rice <= Player.PADDY_RICE_NUM * self.success_rate
+
+    # (n,) earliest tick the player could act, NO_TIME when it has no more paddy rice
+    def getNextActionTime(self) -> np.ndarray:
+        return np.where(self._paddy_rice > 0, np.maximum(self._freeze_tick, self._next_place_tick), NO_TIME)
+
+    # (n,) decision of every game, -1 when the player cannot or does not act
+    def getMove(self, silo:VecVirtualSilo, t:int, active:np.ndarray) -> np.ndarray:
+        actions = np.full(self.n, -1, dtype=np.int64)
+        games = np.flatnonzero(active & (self.getNextActionTime() <= t))
+        columns = silo.getAvailableMove(games)
+        movable = columns.any(axis=1)
+        games, columns = games[movable], columns[movable]
+        if (len(games) == 0):
+            return actions
+
+        available = np.ones((len(games), ACTIONS), dtype=bool)
+        available[:, 1:] = columns
+        codes = silo.getSiloCode(self.team, games)
+        alerts = self.paddy_rice_alert[games]
+
+        chosen = self._policy(codes, alerts, available)
+        explore = self._rng.random(len(games)) <= self._random_rate
+        if (explore.any()):
+            chosen[explore] = randomPolicy(self._rng)(codes[explore], alerts[explore], available[explore])
+        actions[games] = chosen
+
+        if (self.__record == True):
+            self._trace_games.append(games)
+            self._trace_keys.append(((codes << 1) + alerts) * ACTIONS + chosen + 1)
+        return actions
+
+    def place(self, silo:VecVirtualSilo, actions:np.ndarray, t:int) -> None:
+        games = np.flatnonzero(actions >= 0)
+        if (len(games) == 0):
+            return
+        self._next_place_time[games] = TICK_TIMES[t] + self.speed[games]
+        self._next_place_tick[games] = toTicks(self._next_place_time[games])
+        self._paddy_rice[games] -= 1
+        success = self._rng.random(len(games)) <= self.success_rate[games]
+        games = games[success]
+        silo.place(self.team, games, actions[games], self._next_place_time[games])
+
+    # Recorded keys of every game in decision order, as used by AIPlayer.feedReward
+    def getTraces(self) -> list:
+        if (len(self._trace_games) == 0):
+            return [[] for _ in range(self.n)]
+        games = np.concatenate(self._trace_games)
+        keys = np.concatenate(self._trace_keys)
+        order = np.argsort(games, kind='stable')
+        bounds = np.searchsorted(games[order], np.arange(self.n + 1))
+        keys = keys[order].tolist()
+        return [keys[bounds[i]:bounds[i + 1]] for i in range(self.n)]
+
+    # (n,) reward of every game, same values as AIPlayer.feedReward
+    def getRewards(self, winner:np.ndarray, score:np.ndarray) -> np.ndarray:
+        return getRewards(winner, score[:, self.team - 1], score[:, 2 - self.team], self.team)
+
+#N games of two VecPlayer in lockstep
+#tables: lookup tables of tables.py, the silos then run on board codes only
+class VecRobocon2024Game:
+    def __init__(self, player:list, rng:np.random.Generator=None, tables=None) -> None:
+        if (len(player) != 2):
+            raise ValueError("There can only be two player in the game")
+        if (player[0].team == player[1].team or player[0].n != player[1].n):
+            raise RuntimeError("The two players must have different teams and the same number of games")
+        self.player = player
+        self.n = player[0].n
+        self.silo = VecVirtualSilo(self.n, rng=rng) if tables is None else TableVecVirtualSilo(self.n, rng=rng, tables=tables)
+
+    # Play the n games, return the (n,) end game results and the (n, 2) scores
+    def start(self) -> tuple:
+        self.silo.reset()
+        for p in self.player:
+            p.reset()
+        active = np.ones(self.n, dtype=bool)
+        t = 0
+        while t < GAMETICKS and active.any():
+            for p in self.player:
+                p.place(silo=self.silo, actions=p.getMove(silo=self.silo, t=t, active=active), t=t)
+
+            # Jump to the next tick where a player could act or a paddy rice lands, as the event clock
+            next_time = np.minimum(self.silo.getNextPlaceTime(), np.minimum(self.player[0].getNextActionTime(), self.player[1].getNextActionTime()))
+            t = max(t + 1, min(int(next_time[active].min()), GAMETICKS))
+            self.silo.refreshBoard(t, active)
+            active &= self.silo.isEndGame() == NO_WINNER
+        return self.silo.isEndGame(), self.silo.scoreBoard()